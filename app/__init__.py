@@ -24,6 +24,7 @@ from app.blueprints.products import products_bp
 from app.blueprints.orders import orders_bp
 from app.blueprints.errors import errors_bp
 from app.blueprints.admin import admin_bp
+from app.media import media_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(main_bp)
@@ -31,7 +32,8 @@ app.register_blueprint(products_bp)
 app.register_blueprint(orders_bp)
 app.register_blueprint(errors_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(media_bp)
 
 
 
-from app import context_processors 
\ No newline at end of file
+from app import context_processors, commands, assets, user_cache, profiler
\ No newline at end of file
@@ -0,0 +1,109 @@
+from flask import request, url_for
+from sqlalchemy import or_
+
+
+class AdminTable:
+    """
+    Describes a server-side paginated admin list: which columns can be
+    sorted, which are searched by the `q` text box, which filters are
+    available and which relationships the template needs eager loaded.
+    Every page is rendered with one query for the rows and one to count them.
+
+    - sortable: {"name": column} accepted by the `sort` query arg
+    - default_sort: (name, "asc" | "desc")
+    - searchable: columns matched (case-insensitive, substring) against `q`
+    - filters: {"arg": {"value": condition}} or {"arg": callable(value) -> condition}
+    - joins: relationships to join, so their columns can be sorted or searched
+    - options: loader options such as joinedload()/contains_eager()
+    """
+
+    def __init__(self, model, sortable, default_sort, searchable=(), filters=None,
+                 joins=(), options=(), per_page=25):
+        self.model = model
+        self.sortable = sortable
+        self.default_sort = default_sort
+        self.searchable = searchable
+        self.filters = filters or {}
+        self.joins = joins
+        self.options = options
+        self.per_page = per_page
+
+    def filtered(self, args):
+        """
+        Returns (query, search, active_filters): the unordered query for the
+        rows matching the `q` search and filters in `args`, across all pages.
+        """
+        query = self.model.query
+        for target in self.joins:
+            query = query.join(target)
+        if self.options:
+            query = query.options(*self.options)
+
+        search = args.get('q', '').strip()
+        if search and self.searchable:
+            query = query.filter(or_(*[column.ilike(f"%{search}%") for column in self.searchable]))
+
+        active_filters = {}
+        for name, choices in self.filters.items():
+            value = args.get(name)
+            if not value:
+                continue
+            try:
+                condition = choices(value) if callable(choices) else choices.get(value)
+            except ValueError:
+                condition = None
+            if condition is not None:
+                query = query.filter(condition)
+                active_filters[name] = value
+        return query, search, active_filters
+
+    def page(self, args):
+        """
+        Returns the AdminTablePage selected by the request `args`.
+        """
+        query, search, active_filters = self.filtered(args)
+
+        sort = args.get('sort')
+        if sort not in self.sortable:
+            sort = self.default_sort[0]
+        direction = args.get('dir')
+        if direction not in ('asc', 'desc'):
+            direction = self.default_sort[1]
+        column = self.sortable[sort]
+        # The primary key breaks ties so rows don't move between pages
+        tie_breaker = self.model.id.asc() if direction == 'asc' else self.model.id.desc()
+        query = query.order_by(column.asc() if direction == 'asc' else column.desc(), tie_breaker)
+
+        pagination = query.paginate(page=args.get('page', 1, type=int), per_page=self.per_page, error_out=False)
+        return AdminTablePage(pagination, sort, direction, search, active_filters)
+
+
+class AdminTablePage:
+    """
+    One rendered page of an AdminTable, with helpers for the template macros.
+    """
+
+    def __init__(self, pagination, sort, direction, search, filters):
+        self.pagination = pagination
+        self.items = pagination.items
+        self.sort = sort
+        self.direction = direction
+        self.search = search
+        self.filters = filters
+
+    def url(self, **changes):
+        """
+        Returns the current list URL with some query args changed;
+        a change to None removes that arg.
+        """
+        args = request.args.to_dict()
+        args.update(changes)
+        args = {key: value for key, value in args.items() if value not in (None, '')}
+        return url_for(request.endpoint, **request.view_args, **args)
+
+    def sort_url(self, column):
+        """
+        URL sorting by `column`, flipping the direction if it is already the sort column.
+        """
+        direction = 'desc' if self.sort == column and self.direction == 'asc' else 'asc'
+        return self.url(sort=column, dir=direction, page=None)
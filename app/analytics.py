@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func, true
+from app import db, upsert
+from app.leaderboard import week_start
+from app.models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderProduct, Product
+
+UNCATEGORIZED = 0
+PERIODS = ('day', 'week', 'month')
+MAX_DAYS = 10 * 366
+
+# Metrics each rollup can chart
+METRICS = {
+    DailySales: ('revenue', 'orders', 'units', 'shipped_orders', 'shipped_revenue'),
+    DailyProductSales: ('revenue', 'units'),
+    DailyCategorySales: ('revenue', 'units'),
+}
+MONEY = ('revenue', 'shipped_revenue')
+
+
+def day_of(when):
+    return when.date() if isinstance(when, datetime) else when
+
+
+def record_order(order, lines):
+    """
+    Adds a new order to the day's rollups. `lines` are the (product,
+    quantity) pairs it was placed with; each line's revenue is taken at the
+    product's current price. Runs inside the checkout transaction.
+    """
+    day = day_of(order.order_date or datetime.utcnow())
+    per_category = {}
+    units = 0
+    for product, quantity in lines:
+        revenue = Decimal(str(product.price)) * quantity
+        units += quantity
+        upsert.add(DailyProductSales, {'day': day, 'product_id': product.id}, {'units': quantity, 'revenue': revenue})
+        category_id = product.category_id or UNCATEGORIZED
+        category_units, category_revenue = per_category.get(category_id, (0, Decimal('0')))
+        per_category[category_id] = (category_units + quantity, category_revenue + revenue)
+    for category_id, (category_units, category_revenue) in per_category.items():
+        upsert.add(DailyCategorySales, {'day': day, 'category_id': category_id},
+             {'units': category_units, 'revenue': category_revenue})
+    upsert.add(DailySales, {'day': day}, {'orders': 1, 'units': units, 'revenue': order.total_amount})
+
+
+def record_shipped(order_ids, when):
+    """
+    Counts orders shipped at `when` in that day's rollup, with one
+    aggregate over their totals. Runs inside the shipping transaction.
+    """
+    count, revenue = (db.session.query(func.count(Order.id), func.coalesce(func.sum(Order.total_amount), 0))
+                      .filter(Order.id.in_(order_ids)).one())
+    if count:
+        upsert.add(DailySales, {'day': day_of(when)}, {'shipped_orders': count, 'shipped_revenue': revenue})
+
+
+def _bucket(day, period):
+    if period == 'week':
+        return week_start(day)
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def series(metric, start, end, period='day', category_id=None, product_id=None):
+    """
+    Returns a chartable time series of `metric` from `start` to `end`
+    (dates, inclusive) summed per day, week or month, store-wide or for one
+    category or product: {"labels": [...], "values": [...], "total": ...}.
+    Empty periods are zero. Reads at most one rollup row per day.
+    Raises ValueError for unknown metrics, periods or ranges.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}.")
+    if end < start or (end - start).days >= MAX_DAYS:
+        raise ValueError(f"The range must be between 1 and {MAX_DAYS} days.")
+    if product_id is not None:
+        model, scope = DailyProductSales, DailyProductSales.product_id == product_id
+    elif category_id is not None:
+        model, scope = DailyCategorySales, DailyCategorySales.category_id == category_id
+    else:
+        model, scope = DailySales, true()
+    if metric not in METRICS[model]:
+        raise ValueError(f"Unknown metric {metric!r}.")
+
+    column = getattr(model, metric)
+    values = {}
+    day = start
+    while day <= end:
+        values.setdefault(_bucket(day, period), 0)
+        day += timedelta(days=1)
+    for day, value in db.session.query(model.day, column).filter(scope, model.day.between(start, end)):
+        values[_bucket(day, period)] += value or 0
+
+    cast = float if metric in MONEY else int
+    points = [cast(value) for value in values.values()]
+    return {
+        "labels": [bucket.isoformat() for bucket in values],
+        "values": points,
+        "total": round(sum(points), 2) if metric in MONEY else sum(points),
+    }
+
+
+def backfill(batch_size=10000):
+    """
+    Recomputes every rollup from the order tables and commits. Orders and
+    their lines are streamed, so memory grows with days x products, not
+    orders. Line revenue uses current product prices, since order lines
+    don't keep the price paid. Returns the number of days with sales.
+    """
+    days, products, categories = {}, {}, {}
+
+    def add(totals, key, **values):
+        row = totals.setdefault(key, {})
+        for column, value in values.items():
+            row[column] = row.get(column, 0) + value
+
+    orders = (db.session.query(Order.order_date, Order.total_amount, Order.status, Order.shipped_at)
+              .execution_options(yield_per=batch_size))
+    for order_date, total_amount, status, shipped_at in orders:
+        add(days, day_of(order_date), orders=1, revenue=total_amount)
+        if status == 'Shipped':
+            add(days, day_of(shipped_at or order_date), shipped_orders=1, shipped_revenue=total_amount)
+
+    lines = (db.session.query(Order.order_date, OrderProduct.product_id, OrderProduct.quantity,
+                              Product.price, Product.category_id)
+             .join(Order, Order.id == OrderProduct.order_id)
+             .outerjoin(Product, Product.id == OrderProduct.product_id)
+             .execution_options(yield_per=batch_size))
+    for order_date, product_id, quantity, price, category_id in lines:
+        day = day_of(order_date)
+        revenue = Decimal(str(price or 0)) * quantity
+        add(days, day, units=quantity)
+        add(products, (day, product_id), units=quantity, revenue=revenue)
+        add(categories, (day, category_id or UNCATEGORIZED), units=quantity, revenue=revenue)
+
+    for model in (DailySales, DailyProductSales, DailyCategorySales):
+        model.query.delete()
+    tables = (
+        (DailySales, [{"day": day, **values} for day, values in days.items()]),
+        (DailyProductSales, [{"day": day, "product_id": product_id, **values}
+                             for (day, product_id), values in products.items()]),
+        (DailyCategorySales, [{"day": day, "category_id": category_id, **values}
+                              for (day, category_id), values in categories.items()]),
+    )
+    for model, rows in tables:
+        # Bulk inserts need every column in every row
+        columns = [column.name for column in model.__table__.columns]
+        rows = [{column: row.get(column, 0) for column in columns} for row in rows]
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+    db.session.commit()
+    return len(days)
@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory
+from app import app, media
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip copies are made
+    brotli = None
+
+# Source folders under app/static that get fingerprinted, and which extensions are worth compressing
+SOURCE_DIRS = ('css', 'js', 'media')
+FINGERPRINTED = ('.css', '.js', '.svg')
+COMPRESSED = ('.css', '.js', '.svg')
+BUILD_DIR = 'build'
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+
+# Maps source names ("css/main.css") to fingerprinted ones ("build/css/main.3f2a9c1e.css")
+manifest = {}
+
+
+def static_path(*parts):
+    return os.path.join(app.static_folder, *parts)
+
+
+def _fingerprint(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()[:10]
+
+
+def build():
+    """
+    Copies every asset to static/build under a name carrying its content
+    hash, writes .gz (and .br when brotli is installed) copies next to it
+    and saves the manifest. Unchanged assets are skipped, so running it at
+    every startup is cheap. Built files referenced by neither this manifest
+    nor the previous one are deleted; keeping the previous generation lets
+    pages rendered before a deploy still load theirs. Returns the manifest.
+    """
+    result = {}
+    for source_dir in SOURCE_DIRS:
+        for directory, _, names in os.walk(static_path(source_dir)):
+            for name in names:
+                if not name.endswith(FINGERPRINTED):
+                    continue
+                source = os.path.join(directory, name)
+                relative = os.path.relpath(source, app.static_folder).replace(os.sep, '/')
+                data, digest = _fingerprint(source)
+                stem, extension = os.path.splitext(relative)
+                built = f"{BUILD_DIR}/{stem}.{digest}{extension}"
+                _write_outputs(static_path(built), data, extension in COMPRESSED)
+                result[relative] = built
+
+    manifest_path = static_path(BUILD_DIR, MANIFEST)
+    previous = _read_manifest(manifest_path)
+    # Every worker builds at startup: readers must never see a half-written manifest
+    media.write_atomically(manifest_path, json.dumps(result, indent=2, sort_keys=True).encode())
+    _prune(set(result.values()) | set(previous.values()))
+    return result
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _prune(kept):
+    """
+    Deletes the built files (and their compressed copies) not in `kept`.
+    """
+    build_dir = static_path(BUILD_DIR)
+    for directory, _, names in os.walk(build_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+            # Temporary files belong to a write in progress, possibly in another worker
+            if relative == f"{BUILD_DIR}/{MANIFEST}" or name.endswith('.tmp'):
+                continue
+            if relative.removesuffix('.gz').removesuffix('.br') not in kept:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass # Pruned by another worker
+
+
+def _write_outputs(path, data, compress):
+    outputs = {path: lambda: data}
+    if compress:
+        outputs[path + '.gz'] = lambda: gzip.compress(data, compresslevel=9, mtime=0)
+        if brotli is not None:
+            outputs[path + '.br'] = lambda: brotli.compress(data, quality=11)
+    for output, render in outputs.items():
+        if not os.path.exists(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            media.write_atomically(output, render())
+
+
+def load():
+    """
+    Builds the assets if needed and loads the manifest used by url_for().
+    If the static folder is read-only, a manifest built beforehand with
+    `flask assets build` is used instead; failing that, assets are served
+    under their plain names.
+    """
+    global manifest
+    if not app.config['ASSETS_FINGERPRINT']:
+        manifest = {}
+        return manifest
+    try:
+        manifest = build()
+    except OSError as e:
+        manifest = _read_manifest(static_path(BUILD_DIR, MANIFEST))
+        app.logger.warning("Could not build static assets (%s), using %d prebuilt ones.", e, len(manifest))
+    return manifest
+
+
+@app.url_defaults
+def _fingerprinted_url(endpoint, values):
+    if endpoint == 'static' and app.config['ASSETS_FINGERPRINT']:
+        filename = values.get('filename')
+        if filename in manifest:
+            values['filename'] = manifest[filename]
+
+
+def serve_static(filename):
+    """
+    Replaces Flask's static view. Fingerprinted files never change, so they
+    are sent with immutable caching and, when the client accepts it, as
+    their precompressed brotli or gzip copy. Anything else goes through
+    the regular static handling.
+    """
+    if not filename.startswith(BUILD_DIR + '/'):
+        return app.send_static_file(filename)
+
+    accepted = request.accept_encodings
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.isfile(static_path(filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype,
+                                           max_age=MAX_AGE, etag=False)
+            response.content_encoding = encoding
+            response.set_etag(f"{filename}-{encoding}")
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=MAX_AGE, etag=False)
+        response.set_etag(filename)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+app.view_functions['static'] = serve_static
+load()
@@ -1,27 +1,110 @@
+import io
 import os
-from flask import render_template, url_for, flash, redirect, request, Blueprint, jsonify
+from datetime import date, datetime, timedelta
+from flask import render_template, url_for, flash, redirect, request, Blueprint, jsonify, Response, stream_with_context
 from app import app, db
 from flask_login import login_required, current_user
-from app.utils import save_picture,delete_picture
+from app.utils import save_picture,delete_picture,forget_user_content
 from app.decorators import admin_required
 from app.models import User, Product, Order, Newsletter,Cart,Category
 from app.forms import AdminEditUserForm, ProductForm
+from app import search, facets, fulfilment, counters, analytics, catalog, order_export, profiler
+from app.admin_tables import AdminTable
+from app.images import InvalidImage
+from sqlalchemy.orm import joinedload, contains_eager
 
 
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+BULK_FAILURES_SHOWN = 10
+
+users_table = AdminTable(
+    User,
+    sortable={'id': User.id, 'username': User.username, 'email': User.email},
+    default_sort=('id', 'asc'),
+    searchable=(User.username, User.email, User.fname, User.lname),
+    filters={'role': {'admin': User.is_admin.is_(True), 'banned': User.is_banned.is_(True)}},
+)
+products_table = AdminTable(
+    Product,
+    sortable={'id': Product.id, 'name': Product.name, 'price': Product.price, 'stock': Product.stock},
+    default_sort=('id', 'desc'),
+    searchable=(Product.name,),
+    filters={'category': lambda value: Product.category_id == int(value)},
+    options=(joinedload(Product.category),),
+)
+orders_table = AdminTable(
+    Order,
+    sortable={'id': Order.id, 'customer': User.username, 'order_date': Order.order_date,
+              'total_amount': Order.total_amount, 'status': Order.status},
+    default_sort=('order_date', 'desc'),
+    searchable=(User.username, User.email),
+    filters={'status': {'Pending': Order.status == 'Pending', 'Shipped': Order.status == 'Shipped'}},
+    joins=(Order.customer,),
+    options=(contains_eager(Order.customer),),
+)
+subscriptions_table = AdminTable(
+    Newsletter,
+    sortable={'id': Newsletter.id, 'email': Newsletter.email, 'subscription_date': Newsletter.subscription_date},
+    default_sort=('subscription_date', 'desc'),
+    searchable=(Newsletter.email,),
+)
+
 @admin_bp.context_processor
 def inject_pending_orders_count():
-    pending_orders_count = Order.query.filter_by(status='Pending').count()
+    pending_orders_count = counters.get(counters.PENDING_ORDERS)
     return dict(pending_orders_count=pending_orders_count)
 
+@admin_bp.route('/')
+@login_required
+@admin_required
+def dashboard():
+    categories = Category.query.order_by(Category.name).all()
+    return render_template('admin/dashboard.html', categories=categories, metrics=analytics.METRICS[analytics.DailySales],
+                           periods=analytics.PERIODS)
+
+@admin_bp.route('/api/sales')
+@login_required
+@admin_required
+def sales_api():
+    """
+    Time series for the dashboard chart, read from the daily rollups.
+    Query args: metric, period (day/week/month), start and end
+    (YYYY-MM-DD, default the last 30 days), category or product ids.
+    """
+    try:
+        end = _parse_day(request.args.get('end')) or datetime.utcnow().date()
+        start = _parse_day(request.args.get('start')) or end - timedelta(days=29)
+        data = analytics.series(request.args.get('metric', 'revenue'), start, end,
+                                period=request.args.get('period', 'day'),
+                                category_id=request.args.get('category', type=int),
+                                product_id=request.args.get('product', type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(data)
+    response.headers["Cache-Control"] = "private, max-age=60"
+    return response
+
+def _parse_day(value):
+    return date.fromisoformat(value) if value else None
+
+@admin_bp.route('/perf')
+@login_required
+@admin_required
+def perf():
+    """
+    This worker's recent slow requests and requests repeating a statement
+    (likely N+1 queries), as recorded by the SQL profiler.
+    """
+    return render_template('admin/perf.html', requests=profiler.recent_requests())
+
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def users():
-    users = User.query.all()
-    return render_template('admin/users.html', users=users)
+    page = users_table.page(request.args)
+    return render_template('admin/users.html', page=page)
 
 @admin_bp.route('/user/<int:user_id>/delete', methods=['POST'])
 @login_required
@@ -33,19 +116,20 @@ def delete_user(user_id):
         flash("You cannot delete your own account.", "danger")
         return redirect(url_for('admin.users'))
     # Logic condition 2: Prevent deleting the last admin account
-    admin_count = User.query.filter_by(is_admin=True).count()
+    admin_count, user_count = counters.get_many(counters.ADMINS, counters.USERS)
     if user.is_admin and admin_count == 1:
         flash("Cannot delete the last administrator.", "danger")
         return redirect(url_for('admin.users'))
     # Logic condition 3: Prevent deleting the last user in the database
-    if User.query.count() == 1:
+    if user_count == 1:
         flash("Cannot delete the last user in the database.", "danger")
         return redirect(url_for('admin.users'))
         
-    if user.image_file != 'default.png':
-        delete_picture(user.image_file, "static/media/user_pics")
+    pictures = forget_user_content(user)
     db.session.delete(user)
     db.session.commit()
+    for picture, kind in pictures:
+        delete_picture(picture, kind)
     flash('User and their associated data have been deleted!', 'success')
     return redirect(url_for('admin.users'))
 
@@ -75,6 +159,8 @@ def edit_user(user_id):
         user.lname = form. lname.data
         user.username = form.username.data
         user.email = form.email.data
+        if user.is_admin != form.is_admin.data:
+            counters.adjust(counters.ADMINS, 1 if form.is_admin.data else -1)
         user.is_admin = form.is_admin.data
         db.session.commit()
         flash('User has been updated!', 'success')
@@ -91,8 +177,9 @@ def edit_user(user_id):
 @login_required
 @admin_required
 def products():
-    products = Product.query.all()
-    return render_template('admin/products.html', products=products)
+    page = products_table.page(request.args)
+    categories = Category.query.order_by(Category.name).all()
+    return render_template('admin/products.html', page=page, categories=categories)
 
 @admin_bp.route('/product/add', methods=['GET', 'POST'])
 @login_required
@@ -119,9 +206,16 @@ def add_product():
             user_id=current_user.id
         )
         if form.image.data:
-            picture_file = save_picture(form.image.data, 'static/media/product_images')
-            product.image_file = picture_file
+            try:
+                product.image_file = save_picture(form.image.data, 'product')
+            except InvalidImage as e:
+                flash(str(e), 'danger')
+                return render_template('admin/add_product.html', form=form)
         db.session.add(product)
+        db.session.flush()
+        search.index_product(product)
+        facets.product_added(product)
+        counters.adjust(counters.PRODUCTS, 1)
         db.session.commit()
         flash('Product has been added!', 'success')
         return redirect(url_for('admin.products'))
@@ -134,15 +228,26 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     form = ProductForm()
     if form.validate_on_submit():
+        facets_before = facets.snapshot(product)
         product.name = form.name.data
         product.description = form.description.data
         product.category = form.category.data
         product.price = form.price.data
         product.stock = form.stock.data
+        old_picture = product.image_file
         if form.image.data:
-            picture_file = save_picture(form.image.data, 'static/media/product_images')
-            product.image_file = picture_file
+            try:
+                product.image_file = save_picture(form.image.data, 'product')
+            except InvalidImage as e:
+                db.session.rollback()
+                flash(str(e), 'danger')
+                return render_template('admin/edit_product.html', form=form, product=product)
+        db.session.flush()
+        search.index_product(product)
+        facets.product_changed(facets_before, product)
         db.session.commit()
+        if product.image_file != old_picture:
+            delete_picture(old_picture, 'product')
         flash('Product has been updated!', 'success')
         return redirect(url_for('admin.products'))
     elif request.method == 'GET':
@@ -157,20 +262,81 @@ def edit_product(product_id):
 @admin_required
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
-    if product.image_file != 'default.png':
-        delete_picture(product.image_file, "static/media/product_images")
-        
+    picture = product.image_file
+    search.remove_product(product.id)
+    facets.product_removed(product)
+    counters.adjust(counters.PRODUCTS, -1)
     db.session.delete(product)
     db.session.commit()
+    delete_picture(picture, 'product')
     flash('Product has been deleted!', 'success')
     return redirect(url_for('admin.products'))
 
+@admin_bp.route('/catalog/export')
+@login_required
+@admin_required
+def export_catalog():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in catalog.FORMATS:
+        fmt = 'csv'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(catalog.export_products(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=catalog.{fmt}'})
+
+@admin_bp.route('/catalog/import', methods=['POST'])
+@login_required
+@admin_required
+def import_catalog():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or JSONL file to import.', 'info')
+        return redirect(url_for('admin.products'))
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        report = catalog.import_products(stream, catalog.format_for(upload.filename), current_user.id)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        flash('The file is not UTF-8 text; products read before the error were imported.', 'danger')
+        return redirect(url_for('admin.products'))
+    flash(f"Imported {report['created']} new and {report['updated']} updated products.", 'success')
+    for line, message in report['errors'][:BULK_FAILURES_SHOWN]:
+        flash(f'Line {line} skipped: {message}', 'danger')
+    if report['error_count'] > BULK_FAILURES_SHOWN:
+        flash(f"{report['error_count'] - BULK_FAILURES_SHOWN} more line(s) skipped.", 'danger')
+    return redirect(url_for('admin.products'))
+
 @admin_bp.route('/orders')
 @login_required
 @admin_required
 def orders():
-    orders = Order.query.all()
-    return render_template('admin/orders.html', orders=orders)
+    page = orders_table.page(request.args)
+    return render_template('admin/orders.html', page=page)
+
+@admin_bp.route('/orders/export')
+@login_required
+@admin_required
+def export_orders():
+    """
+    Streams orders as CSV or JSONL. Query args: format, start and end
+    (YYYY-MM-DD, inclusive), status, and after_id to resume a download
+    after the last complete order received.
+    """
+    fmt = request.args.get('format', 'csv')
+    status = request.args.get('status')
+    try:
+        start, end = _parse_day(request.args.get('start')), _parse_day(request.args.get('end'))
+    except ValueError:
+        flash('Dates must be in the YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('admin.orders'))
+    if fmt not in order_export.FORMATS or (status and status not in order_export.STATUSES):
+        flash('Unknown export format or status.', 'danger')
+        return redirect(url_for('admin.orders'))
+    after_id = request.args.get('after_id', type=int)
+    chunks = order_export.export_orders(fmt, start=start, end=end, status=status, after_id=after_id,
+                                        header=not after_id)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=orders.{fmt}'})
 
 @admin_bp.route('/order/<int:order_id>')
 @login_required
@@ -185,33 +351,60 @@ def toggle_order_status(order_id):
     order = Order.query.get_or_404(order_id)
     try:
         if order.status == 'Pending':
-            # Decrement product stock when order is shipped
-            for order_product in order.products:
-                product = Product.query.get(order_product.product_id)
-                if product:
-                    product.stock -= order_product.quantity
-            order.status = 'Shipped'
-            flash(f'Order #{order.id} status has been changed to Shipped. Stock updated.', 'success')
-        
-        db.session.commit()
+            shipped, failures = fulfilment.ship_orders([order.id])
+            if shipped:
+                flash(f'Order #{order.id} status has been changed to Shipped. Stock updated.', 'success')
+            else:
+                flash(f'Order #{order.id} was not shipped: {failures[order.id]}', 'danger')
     except Exception as e:
         db.session.rollback()
         flash(f'An error occurred while updating order status and stock: {e}', 'danger')
         
     return redirect(url_for('admin.order_detail', order_id=order.id))
 
+@admin_bp.route('/orders/ship', methods=['POST'])
+@login_required
+@admin_required
+def bulk_ship_orders():
+    """
+    Ships the checked orders, or with `all_matching` every Pending order
+    matching the list's current search and filters.
+    """
+    if request.form.get('all_matching'):
+        query, _, _ = orders_table.filtered(request.form)
+        shipped, failures = fulfilment.ship_matching(query)
+    else:
+        order_ids = request.form.getlist('order_ids', type=int)
+        if not order_ids:
+            flash('No orders selected.', 'info')
+            return redirect(url_for('admin.orders', **_list_args(request.form)))
+        shipped, failures = fulfilment.ship_orders(order_ids)
+
+    if shipped:
+        flash(f'{shipped} order(s) marked as Shipped.', 'success')
+    for order_id, reason in list(failures.items())[:BULK_FAILURES_SHOWN]:
+        flash(f'Order #{order_id} was not shipped: {reason}', 'danger')
+    if len(failures) > BULK_FAILURES_SHOWN:
+        flash(f'{len(failures) - BULK_FAILURES_SHOWN} more order(s) were not shipped.', 'danger')
+    return redirect(url_for('admin.orders', **_list_args(request.form)))
+
+def _list_args(form):
+    # The bulk form carries the list's query args back so the admin returns to the same view
+    return {key: form[key] for key in ('q', 'status', 'sort', 'dir', 'page') if form.get(key)}
+
 @admin_bp.route('/subscriptions')
 @login_required
 @admin_required
 def subscriptions():
-    subscribers = Newsletter.query.all()
-    return render_template('admin/subscriptions.html', subscribers=subscribers)
+    page = subscriptions_table.page(request.args)
+    return render_template('admin/subscriptions.html', page=page)
 
 @admin_bp.route('/subscriber/<int:subscriber_id>/delete', methods=['POST'])
 @login_required
 @admin_required
 def delete_subscriber(subscriber_id):
     subscriber = Newsletter.query.get_or_404(subscriber_id)
+    counters.adjust(counters.SUBSCRIBERS, -1)
     db.session.delete(subscriber)
     db.session.commit()
     flash('Subscriber has been deleted!', 'success')
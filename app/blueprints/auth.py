@@ -1,5 +1,5 @@
 from flask import render_template, url_for, flash, redirect, request, Blueprint
-from app import bcrypt, db
+from app import db, passwords, counters
 from flask_login import login_user, current_user, logout_user
 from app.models import User
 from app.forms import RegistrationForm, LoginForm, ResetPasswordForm, RequestResetForm
@@ -17,9 +17,7 @@ def register():
     # Set is_admin to True if this is the first user, otherwise False
     is_admin_status = True if first_user is None else False
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode(
-            "utf-8"
-        )
+        hashed_password = passwords.hash_password(form.password.data)
         user = User(
             fname=form.fname.data,
             lname=form.lname.data,
@@ -32,6 +30,7 @@ def register():
             is_admin=is_admin_status
         )
         db.session.add(user)
+        counters.user_added(user)
         db.session.commit()
         flash(f"Account created successfully for {form.username.data}", "success")
         return redirect(url_for("auth.login"))
@@ -45,13 +44,14 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and passwords.check_password(user.password, form.password.data):
             # If the user is banned, prevent login and flash a message.
             if user.is_banned:
                 flash("Your account has been banned. Please contact support for more information.", "danger")
                 return redirect(url_for("auth.login"))
-            # Successful login: reset failed attempts
+            # Successful login: reset failed attempts, bring the hash to the current cost
             user.failed_login_attempts = 0
+            passwords.upgrade(user, form.password.data)
             db.session.commit()
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
@@ -86,6 +86,7 @@ def reset_request():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
             send_reset_email(user)
+            db.session.commit()
         flash(
             "If this account exists, you will receive an email with instructions","info")
         return redirect(url_for("auth.login"))
@@ -100,9 +101,7 @@ def reset_password(token):
         return redirect(url_for("auth.reset_request"))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode(
-            "utf-8"
-        )
+        hashed_password = passwords.hash_password(form.password.data)
         user.password = hashed_password
         db.session.commit()
         flash(f"Your password has been updated. You can now log in", "success")
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template
+from app.passwords import HashingBusy
 
 errors_bp = Blueprint('errors', __name__)
 
@@ -12,4 +13,8 @@ def error_404(error):
 
 @errors_bp.app_errorhandler(500)
 def error_500(error):
-    return render_template('errors/500.html'), 500
\ No newline at end of file
+    return render_template('errors/500.html'), 500
+
+@errors_bp.app_errorhandler(HashingBusy)
+def error_hashing_busy(error):
+    return render_template('errors/503.html'), 503, {'Retry-After': '5'}
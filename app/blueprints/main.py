@@ -1,30 +1,50 @@
-from flask import render_template, request, redirect, url_for, flash, Blueprint
+from flask import render_template, request, redirect, url_for, flash, Blueprint, current_app
 from flask_login import login_required, current_user, logout_user
 from app.models import Product, Newsletter, User, Review, Order
 from app.forms import NewsletterForm, UpdateProfileForm, UpdatePasswordForm, DeleteAccountForm
-from app import db, bcrypt
-from app.utils import save_picture
+from app import db, passwords, counters
+from app.utils import save_picture, delete_picture, forget_user_content
+from app.images import InvalidImage, image_url
 from sqlalchemy import func
 from datetime import datetime, timedelta
-from app.utils import get_client_of_the_week
+from app.utils import get_featured_products, get_random_reviews, get_client_of_the_week_snapshot
+from app.cache import cache, invalidate_on
+from app.http_cache import conditional
 
 
 main_bp = Blueprint('main', __name__)
 
+invalidate_on(Product, 'home:featured')
+invalidate_on(Review, 'home:reviews')
+invalidate_on(Order, 'home:client_of_the_week')
+
 
 @main_bp.route("/")
 @main_bp.route("/home")
 def home():
-    featureds_products = Product.query.order_by(Product.price.desc()).limit(4).all()
-    random_reviews = Review.query.order_by(func.random()).limit(5).all()
-    client_of_the_week = get_client_of_the_week()
+    config = current_app.config
+    featureds_products = cache.get_or_set('home:featured', get_featured_products, config['HOME_FEATURED_TTL'])
+    random_reviews = cache.get_or_set('home:reviews', get_random_reviews, config['HOME_REVIEWS_TTL'])
+    client_of_the_week = cache.get_or_set('home:client_of_the_week', get_client_of_the_week_snapshot,
+                                          config['HOME_CLIENT_TTL'])
     return render_template("home.html", featureds=featureds_products, reviews=random_reviews, client_of_the_week=client_of_the_week)
 
 @main_bp.route("/about")
 def about():
     return render_template("about.html", title="About")
 
+def profile_version(username):
+    user = (db.session.query(User.id, User.username, User.fname, User.lname, User.email, User.bio, User.gender,
+                             User.home_address, User.phone_number, User.created_at)
+            .filter_by(username=username).first())
+    if user is None:
+        return None
+    products = (db.session.query(func.count(Product.id), func.max(Product.updated_at))
+                .filter(Product.user_id == user.id).one())
+    return [list(user), list(products)], None
+
 @main_bp.route("/profile/<string:username>")
+@conditional(profile_version)
 def profile(username):
     user = User.query.filter_by(username=username).first_or_404()
     products = Product.query.filter_by(uploader=user).order_by(Product.id.desc()).all()
@@ -38,41 +58,52 @@ def account_settings():
     delete_account_form = DeleteAccountForm()
 
     if request.method == "POST":
+        # The record itself, current_user is a read-only cached copy
+        user = db.session.get(User, current_user.id)
         if update_profile_form.submit_profile.data and update_profile_form.validate_on_submit():
+            old_picture = user.image_file
             if update_profile_form.picture.data:
-                picture_file = save_picture(update_profile_form.picture.data, "static/media/user_pics", output_size=(150, 150))
-                current_user.image_file = picture_file
-            current_user.fname = update_profile_form.fname.data
-            current_user.lname = update_profile_form.lname.data
-            current_user.username = update_profile_form.username.data
-            current_user.email = update_profile_form.email.data
-            current_user.bio = update_profile_form.bio.data
-            current_user.phone_number = update_profile_form.phone_number.data
-            current_user.gender = update_profile_form.gender.data
-            current_user.home_address = update_profile_form.home_address.data
+                try:
+                    user.image_file = save_picture(update_profile_form.picture.data, 'user')
+                except InvalidImage as e:
+                    flash(str(e), "danger")
+                    return redirect(url_for('main.account_settings'))
+            user.fname = update_profile_form.fname.data
+            user.lname = update_profile_form.lname.data
+            user.username = update_profile_form.username.data
+            user.email = update_profile_form.email.data
+            user.bio = update_profile_form.bio.data
+            user.phone_number = update_profile_form.phone_number.data
+            user.gender = update_profile_form.gender.data
+            user.home_address = update_profile_form.home_address.data
             db.session.commit()
+            if user.image_file != old_picture:
+                delete_picture(old_picture, 'user')
             flash("Your profile has been updated!", "success")
             return redirect(url_for('main.account_settings'))
 
         elif update_password_form.submit_password.data and update_password_form.validate_on_submit():
-            if not bcrypt.check_password_hash(current_user.password, update_password_form.current_password.data):
+            if not passwords.check_password(user.password, update_password_form.current_password.data):
                 flash("Incorrect current password.", "danger")
             else:
-                hashed_password = bcrypt.generate_password_hash(update_password_form.new_password.data).decode("utf-8")
-                current_user.password = hashed_password
+                hashed_password = passwords.hash_password(update_password_form.new_password.data)
+                user.password = hashed_password
                 db.session.commit()
                 flash("Your password has been updated!", "success")
             return redirect(url_for('main.account_settings'))
 
         elif delete_account_form.submit_delete.data and delete_account_form.validate_on_submit():
-            if not bcrypt.check_password_hash(current_user.password, delete_account_form.password.data):
+            if not passwords.check_password(user.password, delete_account_form.password.data):
                 flash("Incorrect password. Account not deleted.", "danger")
             else:
                 user_to_delete = User.query.get(current_user.id)
                 logout_user()
                 if user_to_delete:
+                    pictures = forget_user_content(user_to_delete)
                     db.session.delete(user_to_delete)
                     db.session.commit()
+                    for picture, kind in pictures:
+                        delete_picture(picture, kind)
                     flash("Your account has been permanently deleted.", "success")
                     return redirect(url_for('main.home'))
                 else:
@@ -88,7 +119,7 @@ def account_settings():
         update_profile_form.phone_number.data = current_user.phone_number
         update_profile_form.bio.data = current_user.bio
 
-    image_file = url_for("static", filename=f"media/{current_user.image_file}") if current_user.image_file else url_for('static', filename='default.png')
+    image_file = image_url(current_user.image_file, 'user', 'thumb')
 
     return render_template("account.html",
                            title="Account Settings",
@@ -108,6 +139,7 @@ def newsletter_subscribe():
         else:
             subscriber = Newsletter(email=email)
             db.session.add(subscriber)
+            counters.adjust(counters.SUBSCRIBERS, 1)
             db.session.commit()
             flash("Thank you for subscribing to our newsletter!", "success")
     else:
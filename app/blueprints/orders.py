@@ -1,21 +1,21 @@
-from flask import render_template, request, jsonify, Blueprint, flash, redirect, url_for
+from flask import render_template, request, jsonify, Blueprint, flash, redirect, url_for, make_response
 from flask_login import current_user, login_required
 from app import db
 from app.models import Product, Cart, CartItem, Order,OrderProduct
 from app.hundlers import send_order_notification_email
 from decimal import Decimal
+from app import leaderboard, inventory, counters, analytics, cart as cart_counter
 
 orders_bp = Blueprint('orders', __name__)
 
 @orders_bp.route("/cart/count", methods=["GET"])
-@login_required
 def cart_count():
-    if current_user.is_authenticated:
-        cart = current_user.cart
-        if cart:
-            count = sum(item.quantity for item in cart.items)
-            return jsonify({"cart_count": count})
-    return jsonify({"cart_count": 0})
+    # Served from the session counter; kept for clients that still poll it
+    count = cart_counter.get_count() if current_user.is_authenticated else 0
+    response = make_response(jsonify({"cart_count": count}))
+    response.set_etag(f"cart-{count}")
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
 
 @orders_bp.route("/add_to_cart", methods=["POST"])
 @login_required
@@ -41,10 +41,10 @@ def add_to_cart():
         db.session.add(cart_item)
 
     db.session.commit()
+    cart_counter.adjust(int(quantity))
 
-    cart_count = sum(item.quantity for item in cart.items)
     flash("Product added to cart!", "success")
-    return jsonify({"cart_count": cart_count, "message": "Product added to cart!"})
+    return jsonify({"cart_count": cart_counter.get_count(), "message": "Product added to cart!"})
 
 @orders_bp.route("/cart")
 @login_required
@@ -72,6 +72,8 @@ def cart():
             pass
 
     total_price = subtotal_price + shipping_cost
+    # The items are loaded anyway: resync the badge with what the cart really holds
+    cart_counter.set_count(sum(item.quantity for item in cart_items))
 
     return render_template(
         "cart.html",
@@ -96,8 +98,10 @@ def update_cart_item(item_id):
         try:
             quantity = int(quantity_str)
             if quantity > 0:
+                previous_quantity = cart_item.quantity
                 cart_item.quantity = quantity
                 db.session.commit()
+                cart_counter.adjust(quantity - previous_quantity)
                 flash("Cart item updated successfully!", "success")
             else:
                 flash("Quantity must be at least 1.", "danger")
@@ -113,8 +117,10 @@ def remove_from_cart(item_id):
     if cart_item.cart.user_id != current_user.id:
         return jsonify({"error": "Unauthorized"}), 403
 
+    removed_quantity = cart_item.quantity
     db.session.delete(cart_item)
     db.session.commit()
+    cart_counter.adjust(-removed_quantity)
     flash("Product removed from cart!", "success")
 
     return redirect(url_for('orders.cart'))
@@ -128,6 +134,7 @@ def clear_cart():
         CartItem.query.filter_by(cart_id=cart.id).delete()
         db.session.commit()
         flash("Your cart has been cleared.", "success")
+    cart_counter.set_count(0)
     return redirect(url_for('orders.cart'))
 
 
@@ -175,40 +182,54 @@ def checkout():
         flash("Your cart is empty.", "info")
         return redirect(url_for('orders.cart'))
 
-    #  dictionary to aggregate quantities of identical products
-    aggregated_items = {}
+    # Aggregate quantities of identical products, then load them all in one query
+    quantities = {}
     for item in cart.items:
-        product = Product.query.get(item.product_id)
-        if product.id not in aggregated_items:
-            aggregated_items[product.id] = {
-                'quantity': item.quantity,
-                'price': product.price
-            }
-        else:
-            aggregated_items[product.id]['quantity'] += item.quantity
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(quantities.keys()))}
+
+    try:
+        inventory.reserve(quantities)
+    except inventory.OutOfStock:
+        db.session.rollback()
+        short = inventory.shortages(quantities)
+        for product_id, requested, available in short:
+            product = products.get(product_id)
+            name = product.name if product else f"Product #{product_id}"
+            if available:
+                flash(f"Only {available} left of {name} (you asked for {requested}).", "danger")
+            else:
+                flash(f"{name} is out of stock.", "danger")
+        if not short:
+            flash("Stock changed while placing your order, please try again.", "warning")
+        return redirect(url_for('orders.cart'))
 
     total_amount = Decimal('0.00')
-    for item_id, data in aggregated_items.items():
-        total_amount += Decimal(str(data['price'])) * data['quantity']
+    for product_id, quantity in quantities.items():
+        total_amount += Decimal(str(products[product_id].price)) * quantity
 
-    order = Order(user_id=current_user.id, total_amount=total_amount)
+    order = Order(user_id=current_user.id, total_amount=total_amount, stock_reserved=True)
     db.session.add(order)
     db.session.flush() # Flush to get the order ID before committing
 
-    for product_id, data in aggregated_items.items():
+    for product_id, quantity in quantities.items():
         order_product = OrderProduct(
             order_id=order.id, 
             product_id=product_id, 
-            quantity=data['quantity']
+            quantity=quantity
         )
         db.session.add(order_product)
 
+    leaderboard.record_order(order)
+    analytics.record_order(order, [(products[product_id], quantity) for product_id, quantity in quantities.items()])
+    counters.adjust(counters.PENDING_ORDERS, 1)
+
     # Delete all items from the cart after they've been successfully moved to the order
     CartItem.query.filter_by(cart_id=cart.id).delete()
-    
-    db.session.commit()
 
     send_order_notification_email(order)
+    db.session.commit()
+    cart_counter.set_count(0)
 
     flash("Your order has been placed successfully!", "success")
     return redirect(url_for('orders.order_confirmation', order_id=order.id))
@@ -2,12 +2,38 @@ from flask import render_template, request, Blueprint, jsonify
 from flask_login import current_user, login_required
 from app import db
 from app.models import Product, Category, User, Review
+from app import search, facets, ratings
+from app.pagination import paginate_products
+from app.http_cache import conditional, catalog_version
 
 products_bp = Blueprint('products', __name__)
 
+
+def product_version(product_id):
+    # The product row changes with every edit, restock and review (rating aggregates). Usernames
+    # shown on the page (uploader, authors of the listed reviews) live on other rows, so they're
+    # part of the value
+    row = (db.session.query(Product.updated_at, Category.updated_at, User.username)
+           .outerjoin(Category, Product.category_id == Category.id)
+           .outerjoin(User, Product.user_id == User.id)
+           .filter(Product.id == product_id).first())
+    if row is None:
+        return None
+    authors = (db.session.query(User.username).join(Review, Review.user_id == User.id)
+               .filter(Review.product_id == product_id))
+    before = request.args.get('before', type=int)
+    if before:
+        authors = authors.filter(Review.id < before)
+    authors = authors.order_by(Review.id.desc()).limit(ratings.REVIEWS_PER_PAGE)
+    return [*row, [username for (username,) in authors]], max(stamp for stamp in row[:2] if stamp)
+
+def catalog_page_version():
+    # Deleting a product doesn't move the latest timestamp, so the catalog only gets an ETag
+    return catalog_version(), None
+
 @products_bp.route("/products")
+@conditional(catalog_page_version)
 def products():
-    page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category', type=int)
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
@@ -21,22 +47,32 @@ def products():
     if max_price is not None:
         query = query.filter(Product.price <= max_price)
 
-    if sort_by == 'price_asc':
-        query = query.order_by(Product.price.asc())
-    elif sort_by == 'price_desc':
-        query = query.order_by(Product.price.desc())
-    else: # Default to date (id)
-        query = query.order_by(Product.id.desc())
-
     per_page = 16
-    products = query.paginate(page=page, per_page=per_page)
-    categories = Category.query.all()
-    return render_template("products.html", products=products, categories=categories, sort_by=sort_by,title = "PRODUCTS")
+    products = paginate_products(
+        query,
+        sort_by,
+        per_page,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+    )
+    sidebar = facets.get_facets(category_id, min_price, max_price)
+    return render_template("products.html", products=products, categories=sidebar["categories"],
+                           price_histogram=sidebar["histogram"], sort_by=sort_by, title="PRODUCTS")
 
 @products_bp.route("/product/<int:product_id>")
+@conditional(product_version)
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
-    return render_template("product_detail.html", product=product)
+    reviews, next_cursor = ratings.reviews_page(product.id)
+    return render_template("product_detail.html", product=product, product_id=product.id,
+                           reviews=reviews, next_cursor=next_cursor)
+
+@products_bp.route("/product/<int:product_id>/reviews")
+@conditional(product_version)
+def product_reviews(product_id):
+    # HTMX fragment: the next page of reviews plus a "load more" button
+    reviews, next_cursor = ratings.reviews_page(product_id, before=request.args.get('before', type=int))
+    return render_template("_reviews.html", product_id=product_id, reviews=reviews, next_cursor=next_cursor)
 
 @products_bp.route("/products/user/<int:user_id>")
 def user_products(user_id):
@@ -46,11 +82,11 @@ def user_products(user_id):
 
 @products_bp.route("/products/search", methods=["POST"])
 def search_products():
-    search_term = request.form.get("search", "")
+    search_term = request.form.get("search", "").strip()
     if search_term:
-        products = Product.query.filter(Product.name.ilike(f"%{search_term}%")).all()
+        products = search.search(search_term)
     else:
-        products = Product.query.all()
+        products = Product.query.order_by(Product.id.desc()).limit(search.DEFAULT_LIMIT).all()
     return render_template("_search_results.html", products=products)
 
 @products_bp.route("/product/<int:product_id>/add_review", methods=["POST"])
@@ -63,6 +99,12 @@ def add_review(product_id):
 
     if not rating or not text:
         return jsonify({"error": "Rating and text are required."}), 400
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        rating = 0
+    if not 1 <= rating <= 5:
+        return jsonify({"error": "Rating must be between 1 and 5."}), 400
 
     review = Review(
         rating=rating,
@@ -71,6 +113,7 @@ def add_review(product_id):
         product_id=product.id
     )
     db.session.add(review)
+    ratings.review_added(review)
     db.session.commit()
 
     return jsonify({
@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class Cache:
+    """
+    Small in-process cache with a TTL per entry.
+
+    Recomputation is single-flight: when an entry is missing or expired only
+    one thread runs the loader. While it does, other threads get the expired
+    value if there is one, or wait for the fresh value if there isn't.
+
+    Each worker process has its own cache, so a commit in one worker only
+    invalidates that worker's entries; the TTL bounds how stale the others get.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._locks = {}  # key -> [lock, threads using it], only while a get_or_set() needs it
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return default
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, loader, ttl):
+        """
+        Returns the cached value for `key`, calling `loader()` to compute it
+        when it is missing or older than `ttl` seconds.
+        """
+        entry = self._entries.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+
+        lock = self._key_lock(key)
+        try:
+            if entry is not None:
+                # Someone is already refreshing this key: serve the stale value
+                if not lock.acquire(blocking=False):
+                    return entry[0]
+            else:
+                lock.acquire()
+            try:
+                entry = self._entries.get(key)
+                if entry and entry[1] > time.monotonic():
+                    return entry[0]
+                value = loader()
+                self.set(key, value, ttl)
+                return value
+            finally:
+                lock.release()
+        finally:
+            self._release_key_lock(key)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, str) and k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _key_lock(self, key):
+        with self._lock:
+            holder = self._locks.get(key)
+            if holder is None:
+                holder = self._locks[key] = [threading.Lock(), 0]
+            holder[1] += 1
+            return holder[0]
+
+    def _release_key_lock(self, key):
+        # Locks are dropped once no thread uses them, so keys that are never
+        # read again (e.g. counts for arbitrary price filters) don't pile up
+        with self._lock:
+            holder = self._locks[key]
+            holder[1] -= 1
+            if not holder[1]:
+                del self._locks[key]
+
+
+cache = Cache()
+
+# Model class -> list of (key, is_prefix) invalidated when a commit touches it
+_dependencies = {}
+
+
+def invalidate_on(model, *keys, prefix=False):
+    """
+    Registers cache keys to drop whenever a transaction that inserted,
+    updated or deleted `model` rows commits. With prefix=True every key
+    starting with one of `keys` is dropped.
+    """
+    _dependencies.setdefault(model, []).extend((key, prefix) for key in keys)
+
+
+def _touch(session, model):
+    if model in _dependencies:
+        session.info.setdefault('cache_touched', set()).add(model)
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_flush(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        _touch(session, type(obj))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_statements(orm_execute_state):
+    # Query.update() / Query.delete() and bulk insert()/update()/delete() statements skip the flush
+    if ((orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete)
+            and orm_execute_state.bind_mapper):
+        _touch(orm_execute_state.session, orm_execute_state.bind_mapper.class_)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_touched(session):
+    for model in session.info.pop('cache_touched', ()):
+        for key, is_prefix in _dependencies[model]:
+            if is_prefix:
+                cache.invalidate_prefix(key)
+            else:
+                cache.invalidate(key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_touched(session):
+    session.info.pop('cache_touched', None)
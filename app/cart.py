@@ -0,0 +1,60 @@
+from flask import session
+from flask_login import user_logged_in, user_logged_out, user_loaded_from_cookie
+from sqlalchemy import func
+from app import db
+from app.models import Cart, CartItem
+
+SESSION_KEY = 'cart_count'
+
+
+def get_count():
+    """
+    Number of items in the current user's cart, read from the signed
+    session cookie so rendering the badge never touches the database.
+    """
+    return session.get(SESSION_KEY, 0)
+
+
+def set_count(count):
+    session[SESSION_KEY] = max(int(count), 0)
+
+
+def adjust(delta):
+    """
+    Call after a cart mutation commits, with the change in total quantity.
+    """
+    set_count(get_count() + delta)
+
+
+def count_for(user):
+    """
+    Sums the quantities in the user's cart with one aggregate query.
+    """
+    total = (db.session.query(func.coalesce(func.sum(CartItem.quantity), 0))
+             .join(Cart, Cart.id == CartItem.cart_id)
+             .filter(Cart.user_id == user.id)
+             .scalar())
+    return int(total)
+
+
+def refresh(user):
+    """
+    Recounts the cart from the database. Used when a session starts, which
+    also corrects any drift from changes made in another browser.
+    """
+    set_count(count_for(user))
+
+
+@user_logged_in.connect
+def _seed_on_login(sender, user):
+    refresh(user)
+
+
+@user_loaded_from_cookie.connect
+def _seed_on_remembered_login(sender, user):
+    refresh(user)
+
+
+@user_logged_out.connect
+def _clear_on_logout(sender, user):
+    session.pop(SESSION_KEY, None)
@@ -0,0 +1,208 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func, insert, update
+from app import app, db, search, facets, counters
+from app.models import Category, Product
+
+FORMATS = ('csv', 'jsonl')
+# Columns read by imports; the name identifies the product to create or update
+FIELDS = ('name', 'description', 'price', 'stock', 'category')
+EXPORT_FIELDS = ('id',) + FIELDS
+ERRORS_KEPT = 100
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def format_for(filename, default='csv'):
+    """
+    Guesses the format of a file from its extension.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension, default)
+
+
+def read_rows(stream, fmt):
+    """
+    Yields (line number, row dict) from a text stream, one line at a time.
+    """
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, InvalidRow(f"Invalid JSON: {e}")
+            continue
+        yield line_number, row if isinstance(row, dict) else InvalidRow("Expected a JSON object.")
+
+
+def clean(row):
+    """
+    Validates an imported row and returns the product columns it sets.
+    Optional columns missing from the file are left unchanged on updates.
+    """
+    if isinstance(row, InvalidRow):
+        raise row
+    name = str(row.get('name') or '').strip()
+    if not name or len(name) > 100:
+        raise InvalidRow("A name of 1 to 100 characters is required.")
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        raise InvalidRow(f"Invalid price {row.get('price')!r}.")
+    if not price.is_finite() or not 0 <= price < 10 ** 8:
+        raise InvalidRow(f"Invalid price {row.get('price')!r}.")
+    values = {'name': name, 'price': price.quantize(Decimal('0.01'))}
+
+    if row.get('stock') not in (None, ''):
+        try:
+            values['stock'] = int(row['stock'])
+        except (TypeError, ValueError):
+            raise InvalidRow(f"Invalid stock {row['stock']!r}.")
+        if values['stock'] < 0:
+            raise InvalidRow("Stock can't be negative.")
+    if 'description' in row:
+        values['description'] = row['description'] or None
+    if 'category' in row:
+        category = str(row['category'] or '').strip()
+        if len(category) > 50:
+            raise InvalidRow("Category names are at most 50 characters.")
+        values['category'] = category or None
+    return values
+
+
+def _ensure_name_index():
+    # Databases created before the index existed get it here, since imports look products up by name
+    for index in Product.__table__.indexes:
+        if index.name == 'ix_product_name':
+            index.create(db.session.connection(), checkfirst=True)
+    db.session.commit()
+
+
+def _resolve_categories(names, category_ids):
+    """
+    Fills `category_ids` (name -> id) for `names`, creating the missing
+    categories with one INSERT.
+    """
+    missing = [name for name in names if name not in category_ids]
+    if not missing:
+        return
+    category_ids.update(db.session.query(Category.name, Category.id).filter(Category.name.in_(missing)))
+    missing = [name for name in missing if name not in category_ids]
+    if missing:
+        db.session.execute(insert(Category), [{'name': name} for name in missing])
+        category_ids.update(db.session.query(Category.name, Category.id).filter(Category.name.in_(missing)))
+
+
+def _import_chunk(rows, owner_id, category_ids):
+    """
+    Upserts one chunk of cleaned rows (name -> values) in a transaction:
+    one lookup of the existing names, one bulk UPDATE and one bulk INSERT.
+    Returns (created, updated).
+    """
+    _resolve_categories({values['category'] for values in rows.values() if values.get('category')}, category_ids)
+    # Duplicate names already in the database: the oldest product is the one updated
+    existing = dict(db.session.query(Product.name, func.min(Product.id))
+                    .filter(Product.name.in_(rows.keys())).group_by(Product.name))
+
+    updates, inserts = [], []
+    for name, values in rows.items():
+        values = dict(values)
+        if 'category' in values:
+            category = values.pop('category')
+            values['category_id'] = category_ids[category] if category else None
+        if name in existing:
+            updates.append({'id': existing[name], **values})
+        else:
+            inserts.append({'user_id': owner_id, **values})
+    if updates:
+        db.session.execute(update(Product), updates)
+    if inserts:
+        db.session.execute(insert(Product), inserts)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+
+def import_products(stream, fmt, owner_id, chunk_size=None, progress=None):
+    """
+    Creates or updates products from a CSV or JSONL text stream, matching
+    them by name. The stream is read row by row and written `chunk_size`
+    rows per transaction (CATALOG_IMPORT_CHUNK by default), so memory stays
+    bounded by the chunk size whatever the file size. Invalid rows are
+    skipped and reported. `progress(report)` is called after each chunk.
+
+    The search index, facet counts and admin counters are rebuilt once at
+    the end rather than maintained row by row. Returns the report:
+    {"rows", "created", "updated", "errors": [(line, message)], "error_count"}.
+    """
+    chunk_size = chunk_size or app.config['CATALOG_IMPORT_CHUNK']
+    report = {"rows": 0, "created": 0, "updated": 0, "errors": [], "error_count": 0}
+    category_ids = {}
+    chunk = {}
+
+    def flush():
+        created, updated = _import_chunk(chunk, owner_id, category_ids)
+        report["created"] += created
+        report["updated"] += updated
+        chunk.clear()
+        if progress:
+            progress(report)
+
+    _ensure_name_index()
+    for line_number, row in read_rows(stream, fmt):
+        report["rows"] += 1
+        try:
+            values = clean(row)
+        except InvalidRow as e:
+            report["error_count"] += 1
+            if len(report["errors"]) < ERRORS_KEPT:
+                report["errors"].append((line_number, str(e)))
+            continue
+        # A name repeated within a chunk: the last row wins, as it would across chunks
+        chunk[values['name']] = values
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    if report["created"] or report["updated"]:
+        search.rebuild_index()
+        facets.rebuild()
+        counters.reconcile()
+    return report
+
+
+def export_products(fmt, batch_size=1000):
+    """
+    Yields the whole catalog as CSV or JSONL text, a batch of rows at a
+    time, streaming the query so memory stays flat. Files it produces can
+    be imported back.
+    """
+    rows = (db.session.query(Product.id, Product.name, Product.description, Product.price, Product.stock,
+                             Category.name)
+            .outerjoin(Category, Category.id == Product.category_id)
+            .order_by(Product.id)
+            .execution_options(yield_per=batch_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(EXPORT_FIELDS)
+    for count, row in enumerate(rows, start=1):
+        if fmt == 'csv':
+            writer.writerow(row)
+        else:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record['price'] = str(record['price'])
+            buffer.write(json.dumps(record) + '\n')
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,252 @@
+import os
+import time
+import click
+from flask.cli import AppGroup
+from app import app, db, search, facets, leaderboard, outbox, ratings, images, assets, counters, analytics, catalog, order_export, synthetic
+from app.models import OutboxEmail, User
+
+search_cli = AppGroup('search', help='Manage the product search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search_index():
+    """Rebuild the product search index from scratch."""
+    count = search.rebuild_index()
+    click.echo(f"Indexed {count} products.")
+
+
+facets_cli = AppGroup('facets', help='Manage the catalog facet counts.')
+
+
+@facets_cli.command('rebuild')
+def rebuild_facets():
+    """Recount products per category and price bucket."""
+    count = facets.rebuild()
+    click.echo(f"Counted {count} products.")
+
+
+leaderboard_cli = AppGroup('leaderboard', help='Manage the weekly customer spend leaderboard.')
+
+
+@leaderboard_cli.command('rebuild')
+def rebuild_leaderboard():
+    """Recompute weekly spend for every customer from existing orders."""
+    count = leaderboard.rebuild()
+    click.echo(f"Wrote {count} weekly totals.")
+
+
+@leaderboard_cli.command('top')
+@click.option('--week', type=click.DateTime(formats=['%Y-%m-%d']), help='Any day of the week, defaults to this week.')
+@click.option('-n', '--limit', default=10, show_default=True)
+def show_leaderboard(week, limit):
+    """Show the biggest spenders of a week."""
+    for rank, (user, total) in enumerate(leaderboard.top(limit, week), start=1):
+        click.echo(f"{rank:>3}. {user.username:<25} ${total:.2f}")
+
+
+ratings_cli = AppGroup('ratings', help='Manage product rating aggregates.')
+
+
+@ratings_cli.command('rebuild')
+def rebuild_ratings():
+    """Recompute review counts and averages for every product."""
+    count = ratings.rebuild()
+    click.echo(f"Updated ratings of {count} reviewed products.")
+
+
+outbox_cli = AppGroup('outbox', help='Deliver queued emails.')
+
+
+@outbox_cli.command('drain')
+def drain_outbox():
+    """Send every due email once and exit."""
+    count = outbox.drain()
+    click.echo(f"Processed {count} emails.")
+
+
+@outbox_cli.command('work')
+@click.option('--workers', default=None, type=int, help='Defaults to OUTBOX_WORKERS.')
+def run_outbox_workers(workers):
+    """Run outbox workers in the foreground until interrupted."""
+    pool = outbox.OutboxWorkerPool(app, workers or app.config['OUTBOX_WORKERS'] or 1)
+    pool.start()
+    click.echo(f"Started {pool.workers} outbox workers, press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop(timeout=30)
+
+
+@outbox_cli.command('status')
+def outbox_status():
+    """Count queued emails by status."""
+    counts = db.session.query(OutboxEmail.status, db.func.count(OutboxEmail.id)).group_by(OutboxEmail.status)
+    for status, count in counts:
+        click.echo(f"{status:<10}{count}")
+
+
+images_cli = AppGroup('images', help='Manage uploaded images.')
+
+
+@images_cli.command('variants')
+def build_image_variants():
+    """Render the missing resized variants of every stored image."""
+    for kind in images.KINDS:
+        count = images.backfill_variants(kind)
+        click.echo(f"Checked {count} {kind} images.")
+
+
+@images_cli.command('migrate')
+def migrate_images():
+    """Move pictures uploaded before the media store into it."""
+    for kind in images.KINDS:
+        moved = images.migrate_legacy(kind)
+        count = images.backfill_variants(kind)
+        click.echo(f"Moved {moved} {kind} images, {count} now in the media store.")
+
+
+assets_cli = AppGroup('assets', help='Manage fingerprinted static assets.')
+
+
+@assets_cli.command('build')
+def build_assets():
+    """Fingerprint and precompress the static CSS, JS and SVG files."""
+    built = assets.build()
+    click.echo(f"Built {len(built)} assets{'' if assets.brotli else ' (install brotli for .br copies)'}.")
+
+
+counters_cli = AppGroup('counters', help='Manage the admin counters.')
+
+
+@counters_cli.command('reconcile')
+def reconcile_counters():
+    """Recount the admin counters and repair any drift."""
+    drift = counters.reconcile()
+    for name, (stored, actual) in drift.items():
+        click.echo(f"{name}: {'missing' if stored is None else stored} -> {actual}")
+    click.echo(f"Repaired {len(drift)} of {len(counters.SOURCES)} counters.")
+
+
+analytics_cli = AppGroup('analytics', help='Manage the daily sales rollups.')
+
+
+@analytics_cli.command('backfill')
+def backfill_analytics():
+    """Recompute the daily sales rollups from existing orders."""
+    count = analytics.backfill()
+    click.echo(f"Wrote rollups for {count} days with sales.")
+
+
+catalog_cli = AppGroup('catalog', help='Import and export the product catalog.')
+
+
+@catalog_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(catalog.FORMATS), help='Defaults to the file extension.')
+@click.option('--owner', help='Email of the admin recorded as uploader of new products, defaults to the first admin.')
+@click.option('--chunk-size', type=int, help='Products per transaction, defaults to CATALOG_IMPORT_CHUNK.')
+def import_catalog(source, fmt, owner, chunk_size):
+    """Create or update products, matched by name, from a CSV or JSONL file."""
+    query = User.query.filter_by(email=owner) if owner else User.query.filter_by(is_admin=True).order_by(User.id)
+    uploader = query.first()
+    if uploader is None:
+        raise click.ClickException(f"No user {owner}." if owner else "Create an admin first.")
+    started = time.monotonic()
+
+    def progress(report):
+        click.echo(f"{report['rows']} rows read, {report['created']} created, {report['updated']} updated, "
+                   f"{report['error_count']} skipped ({time.monotonic() - started:.0f}s)")
+
+    report = catalog.import_products(source, fmt or catalog.format_for(source.name), uploader.id,
+                                     chunk_size=chunk_size, progress=progress)
+    for line, message in report['errors']:
+        click.echo(f"Line {line}: {message}", err=True)
+    click.echo(f"Imported {report['created'] + report['updated']} products in {time.monotonic() - started:.1f}s.")
+
+
+@catalog_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(catalog.FORMATS), help='Defaults to the file extension, or CSV.')
+def export_catalog(target, fmt):
+    """Write every product as CSV or JSONL, to a file or stdout."""
+    for text in catalog.export_products(fmt or catalog.format_for(target.name)):
+        target.write(text)
+
+
+orders_cli = AppGroup('orders', help='Export orders.')
+
+
+@orders_cli.command('export')
+@click.argument('target', type=click.Path(dir_okay=False, allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(order_export.FORMATS), help='Defaults to the file extension, or CSV.')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First order date included.')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last order date included.')
+@click.option('--status', type=click.Choice(order_export.STATUSES))
+@click.option('--after-id', type=int, help='Only orders with a greater id.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted export to TARGET, with the same filters.')
+def export_orders(target, fmt, start, end, status, after_id, resume):
+    """Write orders with their customer and lines as CSV or JSONL, to a file or stdout."""
+    fmt = fmt or catalog.format_for(target)
+    header, mode = True, 'w'
+    if resume:
+        if target == '-':
+            raise click.UsageError("--resume needs a file.")
+        if os.path.exists(target):
+            offset, resumed = order_export.resume_point(target, fmt)
+            order_export.truncate(target, offset)
+            header, mode = offset == 0, 'a'
+            # An --after-id given with the first run still applies when nothing was written yet
+            after_id = max(after_id or 0, resumed or 0) or None
+            click.echo(f"Resuming after order #{after_id}." if after_id else "Restarting the export.", err=True)
+    chunks = order_export.export_orders(fmt, start=start and start.date(), end=end and end.date(), status=status,
+                                        after_id=after_id, header=header)
+    if target == '-':
+        for text in chunks:
+            click.echo(text, nl=False)
+        return
+    with open(target, mode, encoding='utf-8', newline='') as f:
+        for text in chunks:
+            f.write(text)
+
+
+synthetic_cli = AppGroup('synthetic', help='Generate synthetic data for performance work.')
+
+
+@synthetic_cli.command('generate')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--categories', default=20, show_default=True)
+@click.option('--products', default=1000, show_default=True)
+@click.option('--orders', default=5000, show_default=True)
+@click.option('--reviews', default=2000, show_default=True)
+@click.option('--subscribers', default=500, show_default=True)
+@click.option('--carts', default=0.1, show_default=True, help='Share of the new users with a cart.')
+@click.option('--days', default=730, show_default=True, help='Days of order history.')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day of order history, defaults to today.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--password', default=synthetic.DEFAULT_PASSWORD, show_default=True, help='Password of every new user.')
+def generate_synthetic(users, categories, products, orders, reviews, subscribers, carts, days, until, seed, password):
+    """Add seeded, realistic users, products, orders, reviews, carts and subscribers."""
+    started = time.monotonic()
+
+    def progress(message):
+        click.echo(f"[{time.monotonic() - started:6.1f}s] {message}")
+
+    added = synthetic.generate(users=users, categories=categories, products=products, orders=orders, reviews=reviews,
+                               subscribers=subscribers, carts=carts, days=days, until=until and until.date(),
+                               seed=seed, password=password, progress=progress)
+    click.echo(f"Added {sum(added.values())} rows in {time.monotonic() - started:.1f}s.")
+
+
+app.cli.add_command(search_cli)
+app.cli.add_command(facets_cli)
+app.cli.add_command(leaderboard_cli)
+app.cli.add_command(ratings_cli)
+app.cli.add_command(outbox_cli)
+app.cli.add_command(images_cli)
+app.cli.add_command(assets_cli)
+app.cli.add_command(counters_cli)
+app.cli.add_command(analytics_cli)
+app.cli.add_command(catalog_cli)
+app.cli.add_command(orders_cli)
+app.cli.add_command(synthetic_cli)
@@ -9,4 +9,43 @@ class Config:
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ.get("EMAIL_USER")
     MAIL_PASSWORD = os.environ.get("EMAIL_PASS")
-    ADMIN_EMAIL = "your_admin_email@example.com"
\ No newline at end of file
+    ADMIN_EMAIL = "your_admin_email@example.com"
+    # Outbox: emails are queued in the database and sent by background workers
+    OUTBOX_WORKERS = int(os.environ.get("OUTBOX_WORKERS", 2)) # In-process workers, 0 to rely on `flask outbox work`
+    OUTBOX_BATCH_SIZE = 50 # Emails sent per SMTP connection
+    OUTBOX_POLL_INTERVAL = 5 # Seconds between checks for due emails
+    OUTBOX_LEASE = 300 # Seconds before an unfinished claim can be retried
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_RETRY_BASE = 30 # Seconds before the first retry, doubled on each attempt
+    # Uploaded images: resized variants are rendered by a process pool
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2)) # 0 renders them in the request
+    IMAGE_QUALITY = 80 # WebP quality of the variants
+    IMAGE_MAX_PIXELS = 40_000_000 # Larger uploads are refused before being decoded
+    USER_CACHE_TTL = 30 # Seconds a signed-in user's navbar and permission fields are cached per worker, 0 to query each request
+    # Password hashing: bcrypt runs in a small thread pool so a login burst can't take every worker
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12)) # Stored hashes with another cost are upgraded at login
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2)) # Hashes computed at once, 0 hashes on the request thread
+    PASSWORD_HASH_QUEUE = 16 # Requests that may wait for a worker
+    PASSWORD_HASH_QUEUE_TIMEOUT = 2 # Seconds to wait for room in the queue before answering 503
+    # Static assets are copied under content-hashed names and precompressed at startup; set to 0 while editing them
+    ASSETS_FINGERPRINT = os.environ.get("ASSETS_FINGERPRINT", "1") == "1"
+    # HTML and JSON responses: 304s from row versions, compression of bodies from COMPRESS_MIN_SIZE bytes
+    HTTP_CONDITIONAL = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 5 # Valid for both gzip (1-9) and brotli (0-11)
+    # Media store: uploads are kept under MEDIA_ROOT (default: instance/media) and served by /media/...
+    MEDIA_ROOT = os.environ.get("MEDIA_ROOT")
+    MEDIA_ACCEL = os.environ.get("MEDIA_ACCEL", "") # "x-sendfile" (Apache, lighttpd) or "x-accel" (nginx) to let the web server send files
+    MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media") # nginx internal location aliased to MEDIA_ROOT
+    MEDIA_MAX_AGE = 365 * 24 * 3600 # Stored files never change, browsers may keep them for a year
+    # SQL profiler: statements of each request are timed; debug responses get X-Query-Count/X-Query-Time headers
+    SQL_PROFILER = os.environ.get("SQL_PROFILER", "1") == "1"
+    SQL_PROFILER_SLOW_REQUEST = 500 # Milliseconds from which a request is listed on /admin/perf
+    SQL_PROFILER_REPEATS = 5 # Runs of the same statement shape in one request flagged as a likely N+1
+    SQL_PROFILER_HISTORY = 100 # Requests listed on /admin/perf, per worker
+    SQL_PROFILER_SLOWEST = 5 # Statements kept per listed request
+    CATALOG_IMPORT_CHUNK = 5000 # Products written per transaction by catalog imports
+    # Seconds each home page dataset stays cached
+    HOME_FEATURED_TTL = 300
+    HOME_REVIEWS_TTL = 60
+    HOME_CLIENT_TTL = 600
\ No newline at end of file
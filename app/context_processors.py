@@ -1,13 +1,17 @@
-from app import app
+from app import app, cart
 from flask import session
+from flask_login import current_user
 from app.forms import NewsletterForm
 from datetime import datetime
 
 @app.context_processor
 def inject_global_data():
     cart_count = 0
-    if "cart" in session and session["cart"]:
-        cart_count = sum(item["quantity"] for item in session["cart"])
+    if current_user.is_authenticated:
+        if cart.SESSION_KEY not in session:
+            # Session started before the counter existed: count it once
+            cart.refresh(current_user)
+        cart_count = cart.get_count()
 
     # Store Open/Closed status
     now = datetime.now().time()
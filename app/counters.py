@@ -0,0 +1,91 @@
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Counter, Newsletter, Order, Product, User
+
+PENDING_ORDERS = 'pending_orders'
+USERS = 'users'
+ADMINS = 'admins'
+SUBSCRIBERS = 'subscribers'
+PRODUCTS = 'products'
+
+# How each counter is computed from scratch
+SOURCES = {
+    PENDING_ORDERS: lambda: Order.query.filter_by(status='Pending').count(),
+    USERS: lambda: User.query.count(),
+    ADMINS: lambda: User.query.filter_by(is_admin=True).count(),
+    SUBSCRIBERS: lambda: Newsletter.query.count(),
+    PRODUCTS: lambda: Product.query.count(),
+}
+
+
+def adjust(name, delta):
+    """
+    Moves a counter by `delta` within the caller's transaction, with one
+    atomic UPDATE so concurrent requests can't lose increments. Nothing is
+    recorded until the counters have been built by reconcile().
+    """
+    if delta:
+        Counter.query.filter_by(name=name).update({Counter.value: Counter.value + delta},
+                                                   synchronize_session=False)
+
+
+def user_added(user):
+    adjust(USERS, 1)
+    if user.is_admin:
+        adjust(ADMINS, 1)
+
+
+def user_removed(user):
+    """
+    Call before deleting a user: their products and orders go with them
+    through the cascades.
+    """
+    adjust(USERS, -1)
+    if user.is_admin:
+        adjust(ADMINS, -1)
+    adjust(PRODUCTS, -len(user.uploaded_products))
+    adjust(PENDING_ORDERS, -sum(1 for order in user.orders if order.status == 'Pending'))
+
+
+def get(name):
+    return get_many(name)[0]
+
+
+def get_many(*names):
+    """
+    Returns the values of the given counters with one primary key lookup.
+    Counters not built yet (see reconcile()) are counted from their tables
+    instead, without writing anything, so this is safe in the middle of
+    any request.
+    """
+    values = dict(db.session.query(Counter.name, Counter.value).filter(Counter.name.in_(names)))
+    return [values[name] if name in values else SOURCES[name]() for name in names]
+
+
+def reconcile(attempts=3):
+    """
+    Recounts every counter from its table, repairs the stored values and
+    commits. Returns {name: (stored, actual)} for the counters that were
+    missing (stored None) or had drifted. Meant for `flask counters
+    reconcile` and bulk loads, as it commits the session.
+    """
+    for attempt in range(attempts):
+        stored = dict(db.session.query(Counter.name, Counter.value))
+        drift = {}
+        for name, count in SOURCES.items():
+            actual = count()
+            if stored.get(name) == actual:
+                continue
+            drift[name] = (stored.get(name), actual)
+            if name in stored:
+                Counter.query.filter_by(name=name).update({Counter.value: actual}, synchronize_session=False)
+            else:
+                db.session.add(Counter(name=name, value=actual))
+        try:
+            db.session.commit()
+            return drift
+        except IntegrityError:
+            # Another process built the missing counters first: check theirs
+            db.session.rollback()
+            if attempt == attempts - 1:
+                raise
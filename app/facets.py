@@ -0,0 +1,190 @@
+from bisect import bisect_right
+from sqlalchemy import case, func, literal
+from app import db, upsert
+from app.models import Category, Product, ProductFacet
+
+# Lower edge of each price bucket; the last bucket has no upper edge.
+PRICE_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000)
+UNCATEGORIZED = 0
+_built = False
+
+
+def bucket_for(price):
+    """
+    Returns the index of the price bucket `price` falls into.
+    """
+    return max(bisect_right(PRICE_BUCKETS, float(price)) - 1, 0)
+
+
+def bucket_bounds(bucket):
+    """
+    Returns the (low, high) edges of a bucket, high is None for the last one.
+    """
+    low = PRICE_BUCKETS[bucket]
+    high = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+    return low, high
+
+
+def snapshot(product):
+    """
+    Captures the fields the facets depend on, taken before a product is
+    edited so product_changed() knows which counts to move.
+    """
+    return (product.category_id or UNCATEGORIZED, product.price)
+
+
+def product_added(product):
+    _adjust(*snapshot(product), 1)
+
+
+def product_removed(product):
+    _adjust(*snapshot(product), -1)
+
+
+def product_changed(before, product):
+    after = snapshot(product)
+    if (before[0], bucket_for(before[1])) != (after[0], bucket_for(after[1])):
+        _adjust(*before, -1)
+        _adjust(*after, 1)
+
+
+def _adjust(category_id, price, delta):
+    """
+    Moves the count of one (category, bucket) cell by `delta` within the
+    caller's transaction. Nothing is recorded until rebuild() has run once.
+    """
+    if not is_built():
+        return
+    upsert.add(ProductFacet, {'category_id': category_id, 'bucket': bucket_for(price)}, {'product_count': delta})
+
+
+def is_built():
+    """
+    Returns True once rebuild() has filled product_facet. Only a positive
+    answer is remembered, since the table stays built from then on.
+    """
+    global _built
+    if not _built:
+        _built = db.session.query(ProductFacet.query.exists()).scalar()
+    return _built
+
+
+def _bucket_expression():
+    whens = [(Product.price >= edge, index) for index, edge in reversed(list(enumerate(PRICE_BUCKETS)))]
+    return case(*whens, else_=0)
+
+
+def rebuild():
+    """
+    Recounts every (category, bucket) cell from the product table and commits.
+    A zero row for every cell is kept so an empty catalog still counts as built.
+    """
+    ProductFacet.query.delete()
+    category = func.coalesce(Product.category_id, literal(UNCATEGORIZED))
+    bucket = _bucket_expression()
+    counts = dict(
+        ((category_id, bucket_index), count)
+        for category_id, bucket_index, count in db.session.query(
+            category, bucket, func.count(Product.id)
+        ).group_by(category, bucket)
+    )
+    category_ids = [UNCATEGORIZED] + [c.id for c in Category.query.with_entities(Category.id)]
+    db.session.add_all(
+        ProductFacet(category_id=category_id, bucket=index, product_count=counts.get((category_id, index), 0))
+        for category_id in category_ids
+        for index in range(len(PRICE_BUCKETS))
+    )
+    db.session.commit()
+    return sum(counts.values())
+
+
+def _outside(low, high, min_price, max_price):
+    return (min_price is not None and high is not None and high <= min_price) or \
+        (max_price is not None and low > max_price)
+
+
+def _reaches(max_price, high):
+    """
+    Whether a max_price filter keeps the whole bucket below `high`. Prices
+    have cents, so max_price=high-0.01 (what the histogram links send)
+    covers every price in it.
+    """
+    return high is not None and round(max_price * 100) >= high * 100 - 1
+
+
+def _count_cells(min_price, max_price):
+    """
+    Counts the products of every (category, bucket) cell within the price
+    filter, straight from the product table.
+    """
+    category = func.coalesce(Product.category_id, literal(UNCATEGORIZED))
+    bucket = _bucket_expression()
+    query = db.session.query(category, bucket, func.count(Product.id))
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    return {(cell_category, cell_bucket): count for cell_category, cell_bucket, count in query.group_by(category, bucket)}
+
+
+def get_facets(category_id=None, min_price=None, max_price=None):
+    """
+    Returns the sidebar facets for the current filters:
+
+    - "categories": (category, count) pairs, counted with the price filter
+      but not the category filter, so other categories stay selectable.
+    - "histogram": one dict per price bucket (low, high, count) for the
+      selected category, restricted to the price filter.
+
+    Counts come from the product_facet aggregate. Only buckets cut by
+    min_price/max_price are recounted from the product table, over the
+    covered part of that bucket. Until `flask facets rebuild` (or an import)
+    has built the aggregate, every cell is counted from the product table
+    with one grouped query; page views never build it themselves.
+    """
+    partial = []
+    if is_built():
+        cells, facet_rows = {}, ProductFacet.query.all()
+    else:
+        cells, facet_rows = _count_cells(min_price, max_price), ()
+    for facet in facet_rows:
+        low, high = bucket_bounds(facet.bucket)
+        if _outside(low, high, min_price, max_price):
+            continue
+        if (min_price is not None and min_price > low) or \
+                (max_price is not None and not _reaches(max_price, high)):
+            if facet.bucket not in partial:
+                partial.append(facet.bucket)
+            continue
+        cells[(facet.category_id, facet.bucket)] = facet.product_count
+
+    for bucket in partial:
+        low, high = bucket_bounds(bucket)
+        category = func.coalesce(Product.category_id, literal(UNCATEGORIZED))
+        query = db.session.query(category, func.count(Product.id)).filter(
+            Product.price >= max(low, min_price if min_price is not None else low)
+        )
+        if high is not None:
+            query = query.filter(Product.price < high)
+        if max_price is not None:
+            query = query.filter(Product.price <= max_price)
+        for cell_category, count in query.group_by(category):
+            cells[(cell_category, bucket)] = count
+
+    per_category = {}
+    per_bucket = [0] * len(PRICE_BUCKETS)
+    for (cell_category, bucket), count in cells.items():
+        per_category[cell_category] = per_category.get(cell_category, 0) + count
+        if not category_id or cell_category == category_id:
+            per_bucket[bucket] += count
+
+    histogram = []
+    for bucket, count in enumerate(per_bucket):
+        low, high = bucket_bounds(bucket)
+        if _outside(low, high, min_price, max_price):
+            continue
+        histogram.append({"low": low, "high": high, "count": count})
+
+    categories = [(category, per_category.get(category.id, 0))
+                  for category in Category.query.order_by(Category.name)]
+    return {"categories": categories, "histogram": histogram}
@@ -0,0 +1,111 @@
+from datetime import datetime
+from sqlalchemy import func
+from app import analytics, counters, db, inventory
+from app.models import Order, OrderProduct, Product
+
+CHUNK_SIZE = 500
+
+
+def ship_orders(order_ids, chunk_size=CHUNK_SIZE):
+    """
+    Marks Pending orders as Shipped, `chunk_size` orders per transaction so
+    a large backlog runs in bounded memory and never holds a long lock.
+
+    Orders placed before checkout reserved stock have their stock taken now,
+    with one aggregated UPDATE per chunk. Those that can't be covered by
+    what is left are not shipped.
+
+    Returns (shipped, failures): the number of orders shipped and a
+    {order_id: reason} dict for the others.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    shipped, failures = 0, {}
+    for start in range(0, len(order_ids), chunk_size):
+        chunk_shipped, chunk_failures = _ship_chunk(order_ids[start:start + chunk_size])
+        shipped += chunk_shipped
+        failures.update(chunk_failures)
+    return shipped, failures
+
+
+def ship_matching(query, chunk_size=CHUNK_SIZE):
+    """
+    Ships every Pending order matched by `query`, walking the matching ids
+    in chunks by ascending id so the full id list is never loaded.
+    """
+    ids_query = query.filter(Order.status == 'Pending').with_entities(Order.id).order_by(Order.id)
+    shipped, failures, last_id = 0, {}, 0
+    while True:
+        chunk = [row.id for row in ids_query.filter(Order.id > last_id).limit(chunk_size)]
+        if not chunk:
+            return shipped, failures
+        chunk_shipped, chunk_failures = _ship_chunk(chunk)
+        shipped += chunk_shipped
+        failures.update(chunk_failures)
+        last_id = chunk[-1]
+
+
+def _ship_chunk(order_ids):
+    failures = {}
+    orders = {row.id: row for row in db.session.query(Order.id, Order.status, Order.stock_reserved)
+              .filter(Order.id.in_(order_ids))}
+    to_ship = []
+    for order_id in order_ids:
+        if order_id not in orders:
+            failures[order_id] = "Order not found."
+        elif orders[order_id].status != 'Pending':
+            failures[order_id] = f"Order is already {orders[order_id].status}."
+        else:
+            to_ship.append(order_id)
+
+    legacy = [order_id for order_id in to_ship if not orders[order_id].stock_reserved]
+    if legacy:
+        to_ship, stock_failures = _take_legacy_stock(to_ship, legacy)
+        failures.update(stock_failures)
+
+    if to_ship:
+        now = datetime.utcnow()
+        flipped = Order.query.filter(Order.id.in_(to_ship), Order.status == 'Pending').update(
+            {Order.status: 'Shipped', Order.shipped_at: now}, synchronize_session=False)
+        if flipped != len(to_ship):
+            # Another admin shipped some of these meanwhile; redo the chunk to report them properly
+            db.session.rollback()
+            return _ship_chunk(order_ids)
+        counters.adjust(counters.PENDING_ORDERS, -flipped)
+        analytics.record_shipped(to_ship, now)
+    db.session.commit()
+    return len(to_ship), failures
+
+
+def _take_legacy_stock(to_ship, legacy):
+    """
+    Takes the stock of orders that didn't reserve it at checkout, in id
+    order while it lasts. Returns the orders still to ship and the failures.
+    """
+    lines = {}
+    for order_id, product_id, quantity in (db.session.query(OrderProduct.order_id, OrderProduct.product_id,
+                                                            OrderProduct.quantity)
+                                           .filter(OrderProduct.order_id.in_(legacy))):
+        lines.setdefault(order_id, []).append((product_id, quantity))
+    product_ids = {product_id for order_lines in lines.values() for product_id, _ in order_lines}
+    stock = dict(db.session.query(Product.id, func.coalesce(Product.stock, 0))
+                 .filter(Product.id.in_(product_ids)).all())
+
+    failures, totals = {}, {}
+    for order_id in sorted(legacy):
+        order_lines = lines.get(order_id, [])
+        short = [product_id for product_id, quantity in order_lines
+                 if stock.get(product_id, 0) - totals.get(product_id, 0) < quantity]
+        if short:
+            failures[order_id] = "Not enough stock of product(s) " + ", ".join(f"#{pid}" for pid in short) + "."
+            continue
+        for product_id, quantity in order_lines:
+            totals[product_id] = totals.get(product_id, 0) + quantity
+
+    try:
+        inventory.reserve(totals)
+    except inventory.OutOfStock:
+        # Stock moved since it was read: leave these orders for another try
+        db.session.rollback()
+        failures.update({order_id: "Stock changed while shipping, please retry." for order_id in legacy
+                         if order_id not in failures})
+    return [order_id for order_id in to_ship if order_id not in failures], failures
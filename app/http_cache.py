@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import json
+import time
+from functools import wraps
+from flask import g, request, session
+from flask_login import current_user
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+from app import app, assets, cart, db
+from app.models import Category, Product
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzipped
+    brotli = None
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def catalog_version():
+    """
+    (product count, latest product change, category count, latest category
+    change): changes whenever a product or category is added, edited,
+    deleted, restocked or reviewed. Four indexed aggregates in one query.
+    """
+    return tuple(db.session.query(
+        db.session.query(func.count(Product.id)).scalar_subquery(),
+        db.session.query(func.max(Product.updated_at)).scalar_subquery(),
+        db.session.query(func.count(Category.id)).scalar_subquery(),
+        db.session.query(func.max(Category.updated_at)).scalar_subquery(),
+    ).one())
+
+
+def _viewer():
+    # What the layout shows about the visitor: navbar, admin links, cart badge
+    if not current_user.is_authenticated:
+        return None
+    return (current_user.id, current_user.username, current_user.fname, current_user.is_admin,
+            current_user.image_file, cart.get_count())
+
+
+def conditional(version):
+    """
+    Decorator answering GET requests with 304 Not Modified before the view
+    runs, when the client's copy is still current.
+
+    `version(**view_args)` returns (value, last_modified): a JSON-serializable
+    value that changes whenever the page's data does, and the time of the
+    last change or None when that can't be told (deletions). It returns None
+    when the view should simply run, e.g. to 404.
+
+    The ETag also covers the URL, the visitor, their cart count, the hour
+    (store open/closed, CSRF tokens) and the static asset fingerprints.
+    Pages with pending flash messages are always rendered.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes') or not app.config['HTTP_CONDITIONAL']:
+                return view(*args, **kwargs)
+            result = version(**kwargs)
+            if result is None:
+                return view(*args, **kwargs)
+            value, last_modified = result
+            key = json.dumps([request.full_path, value, _viewer(), int(time.time() // 3600),
+                              sorted(assets.manifest.values())], default=str)
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or session.get('_flashes'):
+                    return response
+            # Weak: the compressed and plain bodies are equivalent, not byte-identical
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+@app.after_request
+def compress(response):
+    """
+    Compresses text and JSON responses larger than COMPRESS_MIN_SIZE with
+    brotli (if installed) or gzip, whichever the client accepts. Streamed
+    responses and files, which bypass the body buffer, are left alone, and
+    so are responses that embed the session's CSRF token: compressing a
+    secret next to reflected input lets its length leak it (BREACH).
+    """
+    if (app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g
+            or response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(data, quality=app.config['COMPRESS_LEVEL']))
+        response.content_encoding = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL']))
+        response.content_encoding = 'gzip'
+    return response
@@ -2,11 +2,15 @@ import os
 import secrets
 
 from app import app, db, mail 
+from app import outbox
 from flask_mail import Message
 from flask import  url_for
 
 
 
+# These helpers queue the emails in the outbox; they are sent once the
+# caller's transaction commits, outside the request.
+
 def send_reset_email(user):
     token = user.get_reset_token()
     msg = Message(
@@ -17,7 +21,7 @@ def send_reset_email(user):
     
     # Plain text body for clients that don't support HTML
     msg.body = f"""To reset your password, visit the following link:
-{url_for('reset_password', token=token, _external=True)}
+{url_for('auth.reset_password', token=token, _external=True)}
 
 If you did not make this request, please ignore this email and no changes will be made."""
 
@@ -27,7 +31,7 @@ If you did not make this request, please ignore this email and no changes will b
         <h2>Password Reset Request</h2>
         <p>Hello {user.fname},</p>
         <p>A password reset request has been made for your account. If you made this request, click the button below to reset your password.</p>
-        <a href="{url_for('reset_password', token=token, _external=True)}" style="
+        <a href="{url_for('auth.reset_password', token=token, _external=True)}" style="
             display: inline-block; 
             padding: 12px 24px; 
             font-size: 16px; 
@@ -42,7 +46,7 @@ If you did not make this request, please ignore this email and no changes will b
         Your Website Team</p>
     </div>
     """
-    mail.send(msg)
+    outbox.enqueue(msg)
 
 def send_order_notification_email(order):
     # Email to customer
@@ -63,7 +67,7 @@ def send_order_notification_email(order):
     <p><strong>Total Amount:</strong> ${order.total_amount:.2f}</p>
     <p>We'll notify you when your order has shipped.</p>
     """
-    mail.send(customer_msg)
+    outbox.enqueue(customer_msg)
 
     # Email to admin
     admin_msg = Message(
@@ -88,4 +92,4 @@ def send_order_notification_email(order):
         {''.join(f'<li>{p.product.name} (x{p.quantity})</li>' for p in order.products)}
     </ul>
     """
-    mail.send(admin_msg)
+    outbox.enqueue(admin_msg)
@@ -0,0 +1,232 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app import app, db, media
+from app.cache import cache
+from app.models import Product, User
+
+# Resized copies made of each upload: name -> longest side in pixels
+PRODUCT_VARIANTS = {'thumb': 160, 'card': 480, 'detail': 1200}
+PROFILE_VARIANTS = {'thumb': 150}
+KINDS = {'product': PRODUCT_VARIANTS, 'user': PROFILE_VARIANTS}
+
+# Rows that reference each kind of image
+COLUMNS = {'product': Product.image_file, 'user': User.image_file}
+
+# Accepted upload formats and the extension originals are stored under
+FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+VARIANT_EXTENSION = '.webp'
+READY_TTL = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def sniff(data):
+    """
+    Checks an upload's header without decoding the pixels and returns the
+    extension to store it under. Raises InvalidImage for anything that is
+    not an accepted format or is too large to decode safely.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("The file is not a valid image.")
+    if image_format not in FORMATS:
+        raise InvalidImage(f"{image_format} images are not supported.")
+    if width * height > app.config['IMAGE_MAX_PIXELS']:
+        raise InvalidImage("The image is too large.")
+    return FORMATS[image_format]
+
+
+def content_name(data, extension):
+    return hashlib.sha256(data).hexdigest()[:32] + extension
+
+
+def variant_name(filename, variant):
+    return f"{os.path.splitext(filename)[0]}_{variant}{VARIANT_EXTENSION}"
+
+
+def render_variants(source_path, variants, quality):
+    """
+    Decodes the original at `source_path` and writes each missing variant
+    ({name: size}) next to it. Runs in a worker process; each file appears
+    atomically so a half-written variant is never served.
+    Returns the names of the variants written.
+    """
+    directory, filename = os.path.split(source_path)
+    written = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        for variant, size in variants.items():
+            path = os.path.join(directory, variant_name(filename, variant))
+            if os.path.exists(path):
+                continue
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=quality, method=4)
+            media.write_atomically(path, buffer.getvalue())
+            written.append(variant)
+    return written
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Not fork: the app already runs outbox and password hashing threads, whose held
+            # locks a forked child would inherit locked
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _executor = ProcessPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                            mp_context=multiprocessing.get_context(method))
+        return _executor
+
+
+def _log_failure(source_path):
+    def callback(future):
+        if future.exception():
+            app.logger.error("Could not create variants of %s: %s", source_path, future.exception())
+    return callback
+
+
+def generate_variants(source_path, variants):
+    """
+    Creates the variants of an original in the worker pool, or right away
+    when IMAGE_WORKERS is 0.
+    """
+    quality = app.config['IMAGE_QUALITY']
+    if not app.config['IMAGE_WORKERS']:
+        return render_variants(source_path, variants, quality)
+    future = _get_executor().submit(render_variants, source_path, variants, quality)
+    future.add_done_callback(_log_failure(source_path))
+    return future
+
+
+def _store(kind, data, extension):
+    filename = content_name(data, extension)
+    source_path = media.save(kind, filename, data)
+    missing = {variant: size for variant, size in KINDS[kind].items()
+               if not media.exists(kind, variant_name(filename, variant))}
+    if missing:
+        generate_variants(source_path, missing)
+    return filename
+
+
+def save_upload(file_storage, kind):
+    """
+    Stores an uploaded image and returns its file name.
+
+    Only the header is checked in the request; the original bytes go to
+    the media store under their content hash, so identical uploads share
+    one file, and the resized variants are rendered in the background.
+    Until they exist, templates fall back to the original.
+    """
+    data = file_storage.read()
+    return _store(kind, data, sniff(data))
+
+
+def _variant_ready(kind, filename, variant):
+    if not media.is_stored(filename):
+        return False
+    key = f"media:ready:{kind}:{variant_name(filename, variant)}"
+    if cache.get(key):
+        return True
+    if media.exists(kind, variant_name(filename, variant)):
+        cache.set(key, True, READY_TTL)
+        return True
+    return False
+
+
+@app.template_global()
+def image_url(filename, kind='product', variant=None):
+    """
+    URL of an image, or of one of its variants once it has been rendered.
+    """
+    filename = filename or 'default.png'
+    if variant and _variant_ready(kind, filename, variant):
+        return media.url(kind, variant_name(filename, variant))
+    return media.url(kind, filename)
+
+
+@app.template_global()
+def image_srcset(filename, kind='product'):
+    """
+    `srcset` value listing the rendered variants of an image by width,
+    empty until they exist.
+    """
+    return ', '.join(f"{media.url(kind, variant_name(filename, variant))} {size}w"
+                     for variant, size in KINDS[kind].items() if _variant_ready(kind, filename, variant))
+
+
+def delete_image(filename, kind):
+    """
+    Deletes an image and its variants. Callers must make sure nothing else
+    references it, since identical uploads share one file.
+    """
+    media.delete(kind, filename)
+    if media.is_stored(filename):
+        for variant in KINDS[kind]:
+            cache.invalidate(f"media:ready:{kind}:{variant_name(filename, variant)}")
+            media.delete(kind, variant_name(filename, variant))
+
+
+def backfill_variants(kind):
+    """
+    Renders the missing variants of every original in the media store,
+    waiting for the pool. Returns the number of originals checked.
+    """
+    variants = KINDS[kind]
+    futures, count = [], 0
+    for directory, _, names in os.walk(os.path.join(media.root(), media.DIRECTORIES[kind])):
+        for name in names:
+            # Variants are the stored names with an underscore
+            if not media.is_stored(name) or '_' in name:
+                continue
+            count += 1
+            result = generate_variants(os.path.join(directory, name), variants)
+            if not isinstance(result, list):
+                futures.append(result)
+    # Failures are logged by generate_variants
+    wait(futures)
+    return count
+
+
+def migrate_legacy(kind):
+    """
+    Moves pictures uploaded before the media store (random names in
+    static/media) into it, points their rows at the new names and queues
+    their variants. Returns the number of files moved.
+    """
+    column = COLUMNS[kind]
+    names = [name for (name,) in db.session.query(column).filter(column.isnot(None)).distinct()
+             if name != 'default.png' and not media.is_stored(name)]
+    moved = 0
+    for name in names:
+        path = media.legacy_path(kind, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            extension = sniff(data)
+        except InvalidImage as e:
+            app.logger.warning("Skipping %s: %s", path, e)
+            continue
+        filename = _store(kind, data, extension)
+        column.class_.query.filter(column == name).update({column: filename}, synchronize_session=False)
+        db.session.commit()
+        media.delete(kind, name)
+        moved += 1
+    return moved
@@ -0,0 +1,49 @@
+from sqlalchemy import case
+from app.models import Product
+
+
+class OutOfStock(Exception):
+    """
+    Raised by reserve() when some lines of an order can't be fulfilled.
+    """
+
+    def __init__(self, quantities):
+        super().__init__("Not enough stock to reserve the order")
+        self.quantities = quantities
+
+
+def _per_product(quantities):
+    return case({product_id: quantity for product_id, quantity in quantities.items()}, value=Product.id)
+
+
+def reserve(quantities):
+    """
+    Takes `quantities` ({product_id: quantity}) out of stock with a single
+    UPDATE that only touches rows still holding enough stock, so concurrent
+    checkouts can never sell the same unit twice.
+
+    Runs inside the caller's transaction. If any product is short, raises
+    OutOfStock: the caller must roll back, which also undoes the rows that
+    were decremented, and can then call shortages() to report the lines.
+    """
+    if not quantities:
+        return
+    wanted = _per_product(quantities)
+    updated = Product.query.filter(Product.id.in_(quantities.keys()), Product.stock >= wanted).update(
+        {Product.stock: Product.stock - wanted},
+        synchronize_session=False,
+    )
+    if updated != len(quantities):
+        raise OutOfStock(quantities)
+
+
+def shortages(quantities):
+    """
+    Returns (product_id, requested, available) for every product that holds
+    less stock than requested; missing products count as 0 available.
+    """
+    rows = dict(Product.query.with_entities(Product.id, Product.stock)
+                .filter(Product.id.in_(quantities.keys())).all())
+    return [(product_id, quantity, rows.get(product_id) or 0)
+            for product_id, quantity in quantities.items()
+            if (rows.get(product_id) or 0) < quantity]
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from app import db, upsert
+from app.models import Order, User, WeeklySpend
+
+
+def week_start(when=None):
+    """
+    Returns the Monday of the week containing `when` (a date or datetime),
+    or of the current week.
+    """
+    when = when or datetime.utcnow()
+    if isinstance(when, datetime):
+        when = when.date()
+    return when - timedelta(days=when.weekday())
+
+
+def record_order(order):
+    """
+    Adds an order's total to its customer's spend for the order's week.
+    Runs inside the checkout transaction, so the leaderboard and the order
+    are committed (or rolled back) together.
+    """
+    upsert.add(WeeklySpend, {'week_start': week_start(order.order_date), 'user_id': order.user_id},
+               {'total_spent': order.total_amount})
+
+
+def top(limit=10, week=None):
+    """
+    Returns the `limit` biggest spenders of `week` (any day of it, defaults
+    to the current week) as (user, total_spent) pairs.
+    """
+    return (db.session.query(User, WeeklySpend.total_spent)
+            .join(WeeklySpend, WeeklySpend.user_id == User.id)
+            .filter(WeeklySpend.week_start == week_start(week))
+            .order_by(WeeklySpend.total_spent.desc())
+            .limit(limit)
+            .all())
+
+
+def client_of_the_week(week=None):
+    """
+    Returns the user who spent the most in `week`, or None.
+    """
+    leader = top(1, week)
+    return leader[0][0] if leader else None
+
+
+def rebuild(batch_size=10000):
+    """
+    Recomputes the whole leaderboard from the order table and commits.
+    Orders are streamed, so memory grows with customers x weeks, not orders.
+    Returns the number of (week, customer) rows written.
+    """
+    totals = {}
+    orders = (db.session.query(Order.user_id, Order.order_date, Order.total_amount)
+              .execution_options(yield_per=batch_size))
+    for user_id, order_date, total_amount in orders:
+        key = (week_start(order_date), user_id)
+        totals[key] = totals.get(key, Decimal('0')) + total_amount
+
+    WeeklySpend.query.delete()
+    rows = [{"week_start": week, "user_id": user_id, "total_spent": total}
+            for (week, user_id), total in totals.items()]
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(WeeklySpend.__table__.insert(), rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
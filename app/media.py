@@ -0,0 +1,115 @@
+import mimetypes
+import os
+import re
+import threading
+from flask import Blueprint, abort, request, url_for
+from werkzeug.utils import send_file
+from app import app
+
+# Subdirectory of each kind of uploaded file, under MEDIA_ROOT and the legacy static folder
+DIRECTORIES = {'product': 'product_images', 'user': 'user_pics'}
+LEGACY_ROOT = 'static/media'
+
+# Content-addressed names: 32 hex digits of the SHA-256, an optional variant, an extension
+STORED_NAME = re.compile(r'^[0-9a-f]{32}(?:_[a-z]+)?\.(?:jpg|png|gif|webp)$')
+
+media_bp = Blueprint('media', __name__)
+
+
+def root():
+    return app.config['MEDIA_ROOT'] or os.path.join(app.instance_path, 'media')
+
+
+def is_stored(name):
+    """
+    True for content-addressed names, False for the default picture and
+    files uploaded before the media store existed.
+    """
+    return bool(name and STORED_NAME.match(name))
+
+
+def path_for(kind, name):
+    """
+    Absolute path of a stored file. Files are sharded on the first two
+    pairs of hex digits of their hash (65,536 directories), so no directory
+    grows past a few hundred entries even with millions of files, and a
+    lookup never needs a listing.
+    """
+    return os.path.join(root(), DIRECTORIES[kind], name[0:2], name[2:4], name)
+
+
+def legacy_path(kind, name):
+    return os.path.join(app.root_path, LEGACY_ROOT, DIRECTORIES[kind], name)
+
+
+def write_atomically(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def save(kind, name, data):
+    """
+    Stores `data` under its content-addressed `name`, unless an identical
+    file is already there. Returns its path.
+    """
+    path = path_for(kind, name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomically(path, data)
+    return path
+
+
+def exists(kind, name):
+    return os.path.exists(path_for(kind, name) if is_stored(name) else legacy_path(kind, name))
+
+
+def delete(kind, name):
+    """
+    Removes a file if it exists; errors are logged, not raised.
+    """
+    path = path_for(kind, name) if is_stored(name) else legacy_path(kind, name)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        app.logger.error("Error deleting file %s: %s", path, e)
+
+
+def url(kind, name):
+    if is_stored(name):
+        return url_for('media.serve', kind=kind, name=name)
+    return url_for('static', filename=f"{LEGACY_ROOT.removeprefix('static/')}/{DIRECTORIES[kind]}/{name}")
+
+
+@media_bp.route('/media/<kind>/<name>')
+def serve(kind, name):
+    """
+    Serves a stored file. A name always refers to the same content, so
+    browsers and proxies may keep it forever. With MEDIA_ACCEL set the
+    front-end server sends the bytes: 'x-sendfile' (Apache, lighttpd) gets
+    the file path, 'x-accel' (nginx) a URI under MEDIA_ACCEL_PREFIX, which
+    must be an internal location aliased to MEDIA_ROOT.
+    """
+    if kind not in DIRECTORIES or not is_stored(name):
+        abort(404)
+    path = path_for(kind, name)
+    if not os.path.isfile(path):
+        abort(404)
+
+    accel = app.config['MEDIA_ACCEL']
+    if accel == 'x-accel':
+        response = app.response_class(mimetype=mimetypes.guess_type(name)[0])
+        relative = os.path.relpath(path, root()).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = f"{app.config['MEDIA_ACCEL_PREFIX'].rstrip('/')}/{relative}"
+        response.set_etag(name)
+    else:
+        response = send_file(path, request.environ, use_x_sendfile=accel == 'x-sendfile',
+                             response_class=app.response_class, etag=name, conditional=True,
+                             max_age=app.config['MEDIA_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['MEDIA_MAX_AGE']
+    response.cache_control.immutable = True
+    return response.make_conditional(request) if accel == 'x-accel' else response
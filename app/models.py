@@ -1,17 +1,9 @@
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from datetime import datetime
 from flask_login import UserMixin
-from app import db, login_manager, app
+from app import db, app
 from flask import current_app
 
-@login_manager.user_loader
-def load_user(user_id):
-    user = db.session.get(User, int(user_id))
-    if user and user.is_banned:
-        return None # User is banned, do not load
-    return user
-
-
 # Association table for the many-to-many relationship between orders and products
 
 order_product_association = db.Table(
@@ -36,7 +28,7 @@ class User(db.Model, UserMixin):
     gender = db.Column(db.String(10), nullable=False)
     phone_number = db.Column(db.String(20), nullable=True)
     home_address = db.Column(db.Text, nullable=True)
-    image_file = db.Column(db.String(20), nullable=False, default="default.png")
+    image_file = db.Column(db.String(200), nullable=False, default="default.png")
     bio = db.Column(db.Text, nullable=True)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     is_banned = db.Column(db.Boolean, default=False, nullable=False)
@@ -48,6 +40,7 @@ class User(db.Model, UserMixin):
     cart = db.relationship('Cart', backref='user', uselist=False, cascade="all, delete-orphan")
     reviews = db.relationship('Review', backref='author', lazy=True, cascade="all, delete-orphan")
     uploaded_products = db.relationship('Product', backref='uploader', lazy=True, cascade="all, delete-orphan")
+    weekly_spend = db.relationship('WeeklySpend', backref='user', lazy=True, cascade="all, delete-orphan")
 
 
     def get_reset_token(self):
@@ -89,6 +82,19 @@ class Product(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # Rating aggregates, maintained by add_review (see app/ratings.py)
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    stars_1 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    stars_2 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    stars_3 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    stars_4 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    stars_5 = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped on every change, including bulk UPDATEs such as stock reservations and rating
+    # aggregates; drives the HTTP validators (see app/http_cache.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.current_timestamp(), nullable=False, index=True)
+
 
     # Relationships
     # 'back_populates' links this relationship to the one on the Order model
@@ -96,6 +102,30 @@ class Product(db.Model):
     orders = db.relationship('OrderProduct', back_populates='product', cascade="all, delete-orphan", passive_deletes=True)
     reviews = db.relationship('Review', backref='product', lazy=True, cascade="all, delete-orphan")
     category = db.relationship('Category', back_populates='products')
+
+    # Composite indexes backing the keyset pagination of the catalog,
+    # one per sort order, with and without a category filter
+    __table_args__ = (
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_category_id', 'category_id', 'id'),
+        db.Index('ix_product_category_price_id', 'category_id', 'price', 'id'),
+        # Catalog imports match products by name
+        db.Index('ix_product_name', 'name'),
+    )
+
+    @property
+    def average_rating(self):
+        """
+        Returns the average review rating, or None when there are no reviews.
+        """
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def star_counts(self):
+        """
+        Returns (stars, count) pairs from 5 stars down to 1.
+        """
+        return [(stars, getattr(self, f"stars_{stars}")) for stars in range(5, 0, -1)]
     
 
 class Category(db.Model):
@@ -105,10 +135,34 @@ class Category(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
+    # Bumped on every change, including bulk UPDATEs; drives the HTTP validators (see app/http_cache.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.current_timestamp(), nullable=False)
 
     # Relationships
     products = db.relationship('Product', back_populates='category', lazy=True)
 
+class ProductFacet(db.Model):
+    """
+    Number of products per category and price bucket, maintained as products
+    are added, edited and deleted so the catalog sidebar never has to count
+    the product table. Uncategorized products are stored under category_id 0.
+    """
+    __tablename__ = 'product_facet'
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    product_count = db.Column(db.Integer, default=0, nullable=False)
+
+class Counter(db.Model):
+    """
+    Named row counts shown in the admin (pending orders, users, admins,
+    subscribers, products), moved by the code paths that change them so
+    admin pages never count whole tables. See app/counters.py.
+    """
+    __tablename__ = 'counter'
+    name = db.Column(db.String(40), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+
 class Order(db.Model):
     """
     Order model to track customer purchases.
@@ -120,12 +174,74 @@ class Order(db.Model):
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     
     status = db.Column(db.String(20), default='Pending', nullable=False)
+    # Set when checkout took the stock out at order time; older orders are decremented when shipped
+    stock_reserved = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    # Set when the order is shipped; orders shipped before it existed count as shipped on their order date
+    shipped_at = db.Column(db.DateTime, nullable=True)
 
     # Relationships
     # 'back_populates' links this relationship to the one on the Product model
     
     products = db.relationship('OrderProduct', back_populates='order', cascade="all, delete-orphan", passive_deletes=True)
 
+class WeeklySpend(db.Model):
+    """
+    Total spent by each customer per week (weeks start on Monday), kept up to
+    date by checkout so the leaderboard never aggregates the order table.
+    """
+    __tablename__ = 'weekly_spend'
+    week_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_spent = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_weekly_spend_week_total', 'week_start', 'total_spent'),
+    )
+
+class DailySales(db.Model):
+    """
+    Store-wide sales per day (UTC): orders placed, units and revenue by
+    order date, orders shipped and their revenue by shipping date. Updated
+    by checkout and shipping so the dashboard never scans the order table.
+    See app/analytics.py.
+    """
+    __tablename__ = 'daily_sales'
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, default=0, nullable=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    shipped_orders = db.Column(db.Integer, default=0, nullable=False)
+    shipped_revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+class DailyProductSales(db.Model):
+    """
+    Units sold and revenue per product and order date.
+    """
+    __tablename__ = 'daily_product_sales'
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_daily_product_sales_product_day', 'product_id', 'day'),
+    )
+
+class DailyCategorySales(db.Model):
+    """
+    Units sold and revenue per category and order date, under the category
+    products had when they were sold. Uncategorized products use category_id 0.
+    """
+    __tablename__ = 'daily_category_sales'
+    day = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_daily_category_sales_category_day', 'category_id', 'day'),
+    )
+
 class Cart(db.Model):
     __tablename__ = 'cart'
     id = db.Column(db.Integer, primary_key=True)
@@ -161,6 +277,11 @@ class Review(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
 
+    # Backs the paginated review list of a product, newest first
+    __table_args__ = (
+        db.Index('ix_review_product_id', 'product_id', 'id'),
+    )
+
     def __repr__(self):
         return f"Review('{self.rating}', '{self.text}')"
 
@@ -178,4 +299,33 @@ class Newsletter(db.Model):
         """
         Returns a string representation of the Newsletter object.
         """
-        return f"Newsletter('{self.email}')"
\ No newline at end of file
+        return f"Newsletter('{self.email}')"
+
+class OutboxEmail(db.Model):
+    """
+    Email waiting to be delivered by the outbox workers. Rows are written in
+    the same transaction as the change that triggers them, so an email is
+    sent if and only if that change was committed.
+    """
+    __tablename__ = 'outbox_email'
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(125), nullable=True)
+    recipients = db.Column(db.JSON, nullable=False)
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    # Pending -> Sending -> Sent, or back to Pending for a retry, or Failed for good
+    status = db.Column(db.String(20), default='Pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    # When a Pending email may be tried again, or when a Sending lease runs out
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"OutboxEmail('{self.subject}', '{self.status}')"
\ No newline at end of file
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from app import db
+from app.models import Order, OrderProduct, Product, User
+
+FORMATS = ('csv', 'jsonl')
+STATUSES = ('Pending', 'Shipped')
+# CSV has one row per order line; JSONL one object per order with its lines in "items"
+ORDER_FIELDS = ('order_id', 'order_date', 'status', 'shipped_at', 'total_amount',
+                'customer_id', 'username', 'email')
+LINE_FIELDS = ('product_id', 'product_name', 'quantity')
+CSV_FIELDS = ORDER_FIELDS + LINE_FIELDS
+
+
+def _query(start, end, status, after_id):
+    query = (db.session.query(Order.id, Order.order_date, Order.status, Order.shipped_at, Order.total_amount,
+                              User.id, User.username, User.email,
+                              OrderProduct.product_id, Product.name, OrderProduct.quantity)
+             .join(User, User.id == Order.user_id)
+             .outerjoin(OrderProduct, OrderProduct.order_id == Order.id)
+             .outerjoin(Product, Product.id == OrderProduct.product_id))
+    if start:
+        query = query.filter(Order.order_date >= start)
+    if end:
+        query = query.filter(Order.order_date < end + timedelta(days=1))
+    if status:
+        query = query.filter(Order.status == status)
+    if after_id:
+        query = query.filter(Order.id > after_id)
+    return query.order_by(Order.id, OrderProduct.product_id)
+
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.isoformat(timespec='seconds')
+    return '' if value is None else str(value)
+
+
+def export_orders(fmt, start=None, end=None, status=None, after_id=None, header=True, batch_size=1000):
+    """
+    Yields the orders placed between the `start` and `end` dates (inclusive)
+    with `status`, with their customer and lines, as CSV or JSONL text in
+    order id order. Rows are fetched `batch_size` at a time from one
+    streaming query and written out as they come, so memory stays flat
+    whatever the size of the export.
+
+    To resume an interrupted export, pass the last order id fully received
+    as `after_id` (and header=False to append to a CSV file).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv' and header:
+        writer.writerow(CSV_FIELDS)
+    rows = _query(start, end, status, after_id).execution_options(yield_per=batch_size)
+
+    current = None
+    for count, row in enumerate(rows, start=1):
+        order, line = row[:len(ORDER_FIELDS)], row[len(ORDER_FIELDS):]
+        if fmt == 'csv':
+            writer.writerow([_text(value) for value in row])
+        else:
+            if current and current['order_id'] != order[0]:
+                buffer.write(json.dumps(current, default=_text) + '\n')
+                current = None
+            if current is None:
+                current = dict(zip(ORDER_FIELDS, order), items=[])
+            if line[0] is not None:
+                current['items'].append(dict(zip(LINE_FIELDS, line)))
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if current:
+        buffer.write(json.dumps(current, default=_text) + '\n')
+    yield buffer.getvalue()
+
+
+def resume_point(path, fmt):
+    """
+    Finds where to resume an interrupted export written to `path`, reading
+    it line by line. Returns (offset, after_id): truncate the file at
+    `offset`, then append the orders after `after_id` (None: from the
+    start) exported with the same filters. A partly written last line is
+    dropped, and in CSV so are all lines of the last order, which may
+    have been cut between two of its lines.
+    """
+    offset, after_id = 0, None
+    last_id = last_start = previous_id = None
+    position = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            start, position = position, position + len(line)
+            if not line.endswith(b'\n'):
+                break
+            try:
+                order_id = int(line.split(b',', 1)[0]) if fmt == 'csv' else json.loads(line)['order_id']
+            except (ValueError, KeyError, TypeError):
+                # The CSV header
+                offset = position
+                continue
+            if fmt == 'jsonl':
+                offset, after_id = position, order_id
+            elif order_id != last_id:
+                previous_id, last_id, last_start = last_id, order_id, start
+    if fmt == 'csv' and last_id is not None:
+        offset, after_id = last_start, previous_id
+    return offset, after_id
+
+
+def truncate(path, offset):
+    with open(path, 'r+b') as f:
+        f.truncate(offset)
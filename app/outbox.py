@@ -0,0 +1,177 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import event, and_
+from sqlalchemy.orm import Session
+from app import db, mail
+from app.models import OutboxEmail
+
+_wakeup = threading.Event()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def enqueue(message):
+    """
+    Queues a flask_mail Message for delivery. The row joins the caller's
+    transaction; workers are woken up once that transaction commits.
+    """
+    db.session.add(OutboxEmail(
+        subject=message.subject,
+        sender=message.sender if isinstance(message.sender, str) else None,
+        recipients=list(message.recipients),
+        body=message.body,
+        html=message.html,
+    ))
+    db.session.info['outbox_enqueued'] = True
+    if current_app.config.get('OUTBOX_WORKERS'):
+        start_workers(current_app._get_current_object())
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('outbox_enqueued', False):
+        _wakeup.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued(session):
+    session.info.pop('outbox_enqueued', None)
+
+
+def claim_batch(limit):
+    """
+    Marks up to `limit` due emails as Sending and returns them. An email
+    stays claimed for OUTBOX_LEASE seconds; if its worker dies before
+    recording the result, another worker picks it up after that.
+    The conditional UPDATE makes sure two workers never claim the same row.
+    """
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=current_app.config['OUTBOX_LEASE'])
+    due = and_(OutboxEmail.status.in_(('Pending', 'Sending')), OutboxEmail.next_attempt_at <= now)
+    candidate_ids = [row.id for row in db.session.query(OutboxEmail.id)
+                     .filter(due).order_by(OutboxEmail.id).limit(limit)]
+    claimed = []
+    for email_id in candidate_ids:
+        updated = OutboxEmail.query.filter(OutboxEmail.id == email_id, due).update(
+            {OutboxEmail.status: 'Sending', OutboxEmail.next_attempt_at: lease_until},
+            synchronize_session=False,
+        )
+        if updated:
+            claimed.append(email_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return OutboxEmail.query.filter(OutboxEmail.id.in_(claimed)).order_by(OutboxEmail.id).all()
+
+
+def deliver_batch(emails):
+    """
+    Sends claimed emails over a single SMTP connection and records the
+    outcome of each one. Failed emails are retried with exponential backoff
+    until OUTBOX_MAX_ATTEMPTS is reached, then marked Failed.
+    """
+    config = current_app.config
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                try:
+                    connection.send(Message(
+                        email.subject,
+                        sender=email.sender or config['MAIL_USERNAME'],
+                        recipients=email.recipients,
+                        body=email.body,
+                        html=email.html,
+                    ))
+                except Exception as e:
+                    _record_failure(email, e)
+                else:
+                    email.status = 'Sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+    except Exception as e:
+        # Connecting (or closing the connection) failed: retry what wasn't sent
+        for email in emails:
+            if email.status == 'Sending':
+                _record_failure(email, e)
+    db.session.commit()
+
+
+def _record_failure(email, error):
+    config = current_app.config
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+        email.status = 'Failed'
+    else:
+        email.status = 'Pending'
+        delay = config['OUTBOX_RETRY_BASE'] * 2 ** (email.attempts - 1)
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def drain(batch_size=None):
+    """
+    Delivers every due email in batches until none is left.
+    Returns the number of emails processed.
+    """
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    processed = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            return processed
+        deliver_batch(batch)
+        processed += len(batch)
+
+
+class OutboxWorkerPool:
+    """
+    Threads that drain the outbox in the background. Each worker sleeps
+    until it is woken by a commit that queued email, or until the poll
+    interval passes so retries and other processes' emails are picked up.
+    """
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.workers = workers
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        poll_interval = self.app.config['OUTBOX_POLL_INTERVAL']
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    drain()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception("Outbox worker error: %s", e)
+                finally:
+                    db.session.remove()
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+
+
+def start_workers(app, workers=None):
+    """
+    Starts the in-process worker pool once per process.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OutboxWorkerPool(app, workers or app.config['OUTBOX_WORKERS'])
+            _pool.start()
+    return _pool
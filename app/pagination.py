@@ -0,0 +1,121 @@
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import func, tuple_
+from app.models import Product
+from app.cache import cache, invalidate_on
+
+# Sort orders supported by the catalog. Every order ends on Product.id so that
+# products with the same price always come back in the same sequence.
+SORT_COLUMNS = {
+    'date_desc': ((Product.id, 'desc'),),
+    'price_asc': ((Product.price, 'asc'), (Product.id, 'asc')),
+    'price_desc': ((Product.price, 'desc'), (Product.id, 'desc')),
+}
+DEFAULT_SORT = 'date_desc'
+COUNT_TTL = 60  # seconds a filtered total stays cached
+
+invalidate_on(Product, 'catalog:count:', prefix=True)
+
+
+class KeysetPagination:
+    """
+    One page of a keyset (cursor) paginated query. Instead of a page number,
+    the next and previous pages are addressed by the sort key of the last and
+    first item on this page, so every page costs one indexed range scan.
+    """
+
+    def __init__(self, items, sort_by, has_next, has_prev, total):
+        self.items = items
+        self.sort_by = sort_by
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.items[-1], self.sort_by) if self.has_next else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self.items[0], self.sort_by) if self.has_prev else None
+
+
+def encode_cursor(product, sort_by):
+    """
+    Encodes the sort key of a product as an opaque string for the URL,
+    e.g. "42" when sorting by date or "19.99_42" when sorting by price.
+    """
+    if sort_by == 'date_desc':
+        return str(product.id)
+    return f"{product.price}_{product.id}"
+
+
+def decode_cursor(cursor, sort_by):
+    """
+    Returns the sort key tuple encoded in `cursor`, or None if it is malformed.
+    """
+    try:
+        if sort_by == 'date_desc':
+            return (int(cursor),)
+        price, product_id = cursor.split('_')
+        return (Decimal(price), int(product_id))
+    except (ValueError, InvalidOperation, AttributeError):
+        return None
+
+
+def paginate_products(query, sort_by, per_page, after=None, before=None):
+    """
+    Returns a KeysetPagination for `query` sorted by `sort_by`.
+    `after` fetches the page following that cursor, `before` the page
+    preceding it; with neither, the first page is returned.
+    """
+    if sort_by not in SORT_COLUMNS:
+        sort_by = DEFAULT_SORT
+    columns = SORT_COLUMNS[sort_by]
+    total = approximate_count(query)
+
+    backwards = False
+    key = None
+    if before:
+        key = decode_cursor(before, sort_by)
+        backwards = key is not None
+    if key is None and after:
+        key = decode_cursor(after, sort_by)
+
+    page_query = query
+    if key is not None:
+        descending = columns[0][1] == 'desc'
+        # Moving backwards flips the comparison and the order, the page is reversed below
+        if descending != backwards:
+            condition = tuple_(*[c for c, _ in columns]) < tuple_(*key)
+        else:
+            condition = tuple_(*[c for c, _ in columns]) > tuple_(*key)
+        page_query = page_query.filter(condition)
+
+    order = []
+    for column, direction in columns:
+        ascending = (direction == 'asc') != backwards
+        order.append(column.asc() if ascending else column.desc())
+
+    # One extra row tells us whether there is another page in this direction
+    items = page_query.order_by(*order).limit(per_page + 1).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+
+    if backwards:
+        items.reverse()
+        return KeysetPagination(items, sort_by, has_next=bool(items), has_prev=more, total=total)
+    return KeysetPagination(items, sort_by, has_next=more, has_prev=key is not None, total=total)
+
+
+def approximate_count(query):
+    """
+    Counts the rows matched by `query`, reusing the result for COUNT_TTL
+    seconds (or until a product changes) so paging through a large catalog
+    doesn't recount it every time.
+    """
+    cache_key = 'catalog:count:' + str(query.statement.compile(compile_kwargs={"literal_binds": True}))
+    return cache.get_or_set(
+        cache_key,
+        lambda: query.order_by(None).with_entities(func.count(Product.id)).scalar(),
+        COUNT_TTL,
+    )
@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import app, bcrypt
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class HashingBusy(RuntimeError):
+    """
+    Raised when every hashing worker is busy and the queue stayed full for
+    PASSWORD_HASH_QUEUE_TIMEOUT seconds. Answered with a 503.
+    """
+    pass
+
+
+def _get_executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = app.config['PASSWORD_HASH_WORKERS']
+            _slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='passwords')
+        return _executor, _slots
+
+
+def _run(fn, *args):
+    """
+    Runs a bcrypt call in the hashing pool and waits for its result.
+
+    bcrypt releases the GIL, so at most PASSWORD_HASH_WORKERS hashes use
+    CPU at a time however many requests ask for one; the rest wait in a
+    queue of PASSWORD_HASH_QUEUE. When the queue is full for longer than
+    PASSWORD_HASH_QUEUE_TIMEOUT the request fails fast with HashingBusy
+    instead of holding its worker. With PASSWORD_HASH_WORKERS = 0 the call
+    runs on the request thread.
+    """
+    if not app.config['PASSWORD_HASH_WORKERS']:
+        return fn(*args)
+    executor, slots = _get_executor()
+    if not slots.acquire(timeout=app.config['PASSWORD_HASH_QUEUE_TIMEOUT']):
+        app.logger.warning("Password hashing queue full, refusing request.")
+        raise HashingBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    """
+    Hashes a password at the configured BCRYPT_LOG_ROUNDS cost.
+    """
+    return _run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+
+def check_password(hashed, password):
+    return _run(bcrypt.check_password_hash, hashed, password)
+
+
+def cost(hashed):
+    # "$2b$12$<salt and checksum>": the cost is the second field
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    return cost(hashed) != app.config['BCRYPT_LOG_ROUNDS']
+
+
+def upgrade(user, password):
+    """
+    Rehashes a user's password at the target cost after a successful check,
+    when the stored hash was made with another one. The caller commits.
+    Skipped when the pool is busy; the next login will try again.
+    """
+    if not needs_rehash(user.password):
+        return False
+    try:
+        user.password = hash_password(password)
+    except HashingBusy:
+        return False
+    return True
@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from flask import g, request, request_started
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+# Profiles collecting the statements run in this context: the request's, and any test helpers around it
+_active = ContextVar('sql_profiles', default=())
+# Summaries of this worker's recent slow requests and requests repeating statements, newest last
+recent = deque(maxlen=app.config['SQL_PROFILER_HISTORY'])
+_recent_lock = threading.Lock()
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """
+    The shape of a statement: literals become ?, IN lists of any length
+    become (?), so the same query run for different rows compares equal.
+    """
+    statement = _LITERALS.sub('?', statement)
+    statement = _LISTS.sub('(?)', statement)
+    return _SPACES.sub(' ', statement).strip()
+
+
+class Profile:
+    """
+    The statements run while it is active, with their durations.
+    """
+
+    def __init__(self, label=None):
+        self.label = label
+        self.statements = [] # (statement, milliseconds)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def db_ms(self):
+        return sum(duration for _, duration in self.statements)
+
+    def slowest(self, n=5):
+        return sorted(self.statements, key=lambda entry: entry[1], reverse=True)[:n]
+
+    def repeated(self, threshold=2):
+        """
+        Fingerprints run at least `threshold` times, most frequent first:
+        [(fingerprint, count, milliseconds)]. Usually an N+1 loop.
+        """
+        counts, durations = Counter(), Counter()
+        for statement, duration in self.statements:
+            shape = fingerprint(statement)
+            counts[shape] += 1
+            durations[shape] += duration
+        return [(shape, count, durations[shape]) for shape, count in counts.most_common() if count >= threshold]
+
+    def report(self):
+        lines = [f"{self.count} queries in {self.db_ms:.1f}ms"]
+        lines += [f"  {count}x {shape}" for shape, count, _ in self.repeated()]
+        lines += [f"  {duration:.1f}ms {statement}" for statement, duration in self.slowest()]
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(label=None):
+    """
+    Collects the statements run inside the block, including those of
+    requests made through the test client, into the Profile it yields.
+    """
+    current = Profile(label)
+    _active.set(_active.get() + (current,))
+    try:
+        yield current
+    finally:
+        _active.set(tuple(p for p in _active.get() if p is not current))
+
+
+@contextmanager
+def assert_max_queries(limit, repeats=None, label=None):
+    """
+    Test helper: fails with the statements run when the block runs more
+    than `limit` queries, or (if `repeats` is given) any statement shape
+    more than `repeats` times.
+
+        with profiler.assert_max_queries(6, repeats=1):
+            client.get('/cart')
+    """
+    with profile(label) as current:
+        yield current
+    where = f" in {label}" if label else ""
+    if current.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries{where}, got {current.report()}")
+    if repeats is not None and current.repeated(repeats + 1):
+        raise AssertionError(f"A statement ran more than {repeats} times{where}: {current.report()}")
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own context: a statement that raises never
+    # reaches after_cursor_execute, and its start time goes away with it
+    if _active.get() and context is not None:
+        context.profiler_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    profiles = _active.get()
+    start = getattr(context, 'profiler_start', None)
+    if not profiles or start is None:
+        return
+    duration = (time.perf_counter() - start) * 1000
+    for current in profiles:
+        current.statements.append((statement, duration))
+
+
+@request_started.connect_via(app)
+def _start_request(sender, **extra):
+    # A signal rather than before_request, so the other before_request hooks' queries count too
+    if app.config['SQL_PROFILER']:
+        g.sql_profile = Profile(request.endpoint)
+        g.sql_profile_started = time.perf_counter()
+        _active.set(_active.get() + (g.sql_profile,))
+
+
+@app.after_request
+def _query_headers(response):
+    current = g.get('sql_profile')
+    if current is not None and app.debug:
+        response.headers['X-Query-Count'] = str(current.count)
+        response.headers['X-Query-Time'] = f"{current.db_ms:.1f}ms"
+        repeated = current.repeated(app.config['SQL_PROFILER_REPEATS'])
+        if repeated:
+            response.headers['X-Query-Repeated'] = str(sum(count for _, count, _ in repeated))
+    g.sql_profile_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def _finish_request(exc):
+    current = g.pop('sql_profile', None)
+    if current is None:
+        return
+    _active.set(tuple(p for p in _active.get() if p is not current))
+    duration = (time.perf_counter() - g.pop('sql_profile_started')) * 1000
+    repeated = current.repeated(app.config['SQL_PROFILER_REPEATS'])
+    if duration < app.config['SQL_PROFILER_SLOW_REQUEST'] and not repeated:
+        return
+    summary = {
+        'at': datetime.utcnow(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': 500 if exc else g.get('sql_profile_status'),
+        'duration_ms': duration,
+        'queries': current.count,
+        'db_ms': current.db_ms,
+        'slowest': current.slowest(app.config['SQL_PROFILER_SLOWEST']),
+        'repeated': repeated,
+    }
+    with _recent_lock:
+        recent.append(summary)
+
+
+def recent_requests():
+    with _recent_lock:
+        return list(reversed(recent))
@@ -0,0 +1,72 @@
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Product, Review
+
+REVIEWS_PER_PAGE = 10
+
+
+def _adjust(product_id, rating, delta):
+    star_column = getattr(Product, f"stars_{rating}")
+    Product.query.filter_by(id=product_id).update(
+        {
+            Product.rating_count: Product.rating_count + delta,
+            Product.rating_sum: Product.rating_sum + rating * delta,
+            star_column: star_column + delta,
+        },
+        synchronize_session=False,
+    )
+
+
+def review_added(review):
+    """
+    Adds a review to its product's aggregates with a single UPDATE of
+    relative increments, so concurrent reviews never overwrite each other.
+    Runs inside the caller's transaction, alongside the review insert.
+    """
+    _adjust(review.product_id, review.rating, 1)
+
+
+def review_removed(review):
+    _adjust(review.product_id, review.rating, -1)
+
+
+def rebuild():
+    """
+    Recomputes every product's aggregates from the review table and commits.
+    Returns the number of products that have reviews.
+    """
+    stats = (db.session.query(
+        Review.product_id.label('product_id'),
+        func.count(Review.id).label('rating_count'),
+        func.sum(Review.rating).label('rating_sum'),
+        *[func.sum(case((Review.rating == stars, 1), else_=0)).label(f"stars_{stars}") for stars in range(1, 6)],
+    ).group_by(Review.product_id).subquery())
+
+    Product.query.update({
+        Product.rating_count: 0, Product.rating_sum: 0, Product.stars_1: 0, Product.stars_2: 0,
+        Product.stars_3: 0, Product.stars_4: 0, Product.stars_5: 0,
+    }, synchronize_session=False)
+    rows = db.session.query(stats).all()
+    if rows:
+        db.session.execute(
+            Product.__table__.update().where(Product.__table__.c.id == db.bindparam('b_id')),
+            [{'b_id': row.product_id, **{key: getattr(row, key) for key in row._fields if key != 'product_id'}}
+             for row in rows],
+        )
+    db.session.commit()
+    return len(rows)
+
+
+def reviews_page(product_id, before=None, per_page=REVIEWS_PER_PAGE):
+    """
+    Returns (reviews, next_cursor) for a product, newest first, with their
+    authors loaded in the same query. `before` is the id of the last review
+    already shown; next_cursor is None on the last page.
+    """
+    query = Review.query.options(joinedload(Review.author)).filter(Review.product_id == product_id)
+    if before:
+        query = query.filter(Review.id < before)
+    reviews = query.order_by(Review.id.desc()).limit(per_page + 1).all()
+    next_cursor = reviews[per_page - 1].id if len(reviews) > per_page else None
+    return reviews[:per_page], next_cursor
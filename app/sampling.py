@@ -0,0 +1,69 @@
+import math
+import random
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Review
+from app.cache import cache, invalidate_on
+
+MAX_ROUNDS = 5
+MAX_PROBES = 1000  # ids looked up in a single round
+BOUNDS_TTL = 300
+
+invalidate_on(Review, 'reviews:id_bounds')
+
+_random = random.Random()
+
+
+def _id_bounds():
+    return tuple(db.session.query(func.min(Review.id), func.max(Review.id)).one())
+
+
+def sample_reviews(k, min_rating=None):
+    """
+    Returns up to `k` distinct reviews chosen uniformly at random, optionally
+    only those rated `min_rating` or more, with their authors loaded.
+
+    Random ids between the smallest and largest review id are looked up by
+    primary key; ids that hit a gap (deleted rows) or a filtered-out rating
+    are simply redrawn, which keeps every matching review equally likely.
+    Each round draws more ids when the previous one had a low hit rate.
+    Only when the table is too sparse to fill the sample that way does it
+    fall back to ORDER BY random() for the remainder.
+    """
+    low, high = cache.get_or_set('reviews:id_bounds', _id_bounds, BOUNDS_TTL)
+    if low is None or k <= 0:
+        return []
+
+    picked = {}
+    hit_rate = 1.0
+    for _ in range(MAX_ROUNDS):
+        need = k - len(picked)
+        if need <= 0:
+            break
+        probes = min(math.ceil(need / max(hit_rate, 0.01) * 1.5), MAX_PROBES, high - low + 1)
+        candidates = {_random.randint(low, high) for _ in range(probes)} - picked.keys()
+        if not candidates:
+            continue
+        query = Review.query.options(joinedload(Review.author)).filter(Review.id.in_(candidates))
+        if min_rating is not None:
+            query = query.filter(Review.rating >= min_rating)
+        found = query.all()
+        hit_rate = len(found) / len(candidates)
+        _random.shuffle(found)
+        for review in found[:need]:
+            picked[review.id] = review
+
+    need = k - len(picked)
+    if need > 0:
+        query = Review.query.options(joinedload(Review.author))
+        if picked:
+            query = query.filter(Review.id.notin_(picked.keys()))
+        if min_rating is not None:
+            query = query.filter(Review.rating >= min_rating)
+        for review in query.order_by(func.random()).limit(need):
+            picked[review.id] = review
+
+    reviews = list(picked.values())
+    _random.shuffle(reviews)
+    return reviews
@@ -0,0 +1,145 @@
+import re
+from sqlalchemy import text
+from app import db
+from app.models import Product, Category
+
+# Relative weight of each indexed column when ranking with bm25(),
+# in the same order as the columns of the virtual table.
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0)
+DEFAULT_LIMIT = 50
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_fts_available = None
+_index_exists = False
+
+
+def fts_available():
+    """
+    Returns True when the database supports SQLite FTS5 virtual tables.
+    Other backends fall back to a LIKE query over name, description and category.
+    """
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = db.engine.dialect.name == 'sqlite' and bool(db.session.execute(
+            text("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+        ).scalar())
+    return _fts_available
+
+
+def index_exists():
+    """
+    Returns True once the product_search table has been built.
+    """
+    global _index_exists
+    if not _index_exists and fts_available():
+        _index_exists = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'")
+        ).scalar() is not None
+    return _index_exists
+
+
+def index_product(product):
+    """
+    Adds or refreshes a product in the search index. Call it after the product
+    has been flushed so it has an id; it joins the caller's transaction.
+    Nothing happens until the index has been built once.
+    """
+    if not index_exists():
+        return
+    db.session.execute(text("DELETE FROM product_search WHERE rowid = :id"), {"id": product.id})
+    db.session.execute(
+        text("INSERT INTO product_search (rowid, name, description, category) "
+             "VALUES (:id, :name, :description, :category)"),
+        {
+            "id": product.id,
+            "name": product.name,
+            "description": product.description or "",
+            "category": product.category.name if product.category else "",
+        },
+    )
+
+
+def remove_product(product_id):
+    """
+    Removes a product from the search index within the caller's transaction.
+    """
+    if not index_exists():
+        return
+    db.session.execute(text("DELETE FROM product_search WHERE rowid = :id"), {"id": product_id})
+
+
+def rebuild_index():
+    """
+    Drops and repopulates the whole index from the product table, then commits.
+    Returns the number of indexed products.
+    """
+    global _index_exists
+    if not fts_available():
+        return 0
+    db.session.execute(text("DROP TABLE IF EXISTS product_search"))
+    db.session.execute(text(
+        "CREATE VIRTUAL TABLE product_search "
+        "USING fts5(name, description, category, tokenize='unicode61 remove_diacritics 2')"
+    ))
+    db.session.execute(text(
+        "INSERT INTO product_search (rowid, name, description, category) "
+        "SELECT product.id, product.name, coalesce(product.description, ''), coalesce(category.name, '') "
+        "FROM product LEFT OUTER JOIN category ON category.id = product.category_id"
+    ))
+    db.session.execute(text("INSERT INTO product_search (product_search) VALUES ('optimize')"))
+    db.session.commit()
+    _index_exists = True
+    return db.session.execute(text("SELECT count(*) FROM product_search")).scalar()
+
+
+def build_match_query(search_term):
+    """
+    Turns free text typed in the search box into an FTS5 MATCH expression.
+    Every word is quoted (so FTS operators typed by users are harmless) and
+    the last one is a prefix match, since the box searches as you type.
+    """
+    tokens = _TOKEN_RE.findall(search_term)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(search_term, limit=DEFAULT_LIMIT):
+    """
+    Returns up to `limit` products matching `search_term`, best match first.
+    Until the index has been built with `flask search rebuild` (or by an
+    import), this falls back to a LIKE scan rather than building it in the
+    request.
+    """
+    if not fts_available() or not index_exists():
+        return _search_like(search_term, limit)
+
+    match = build_match_query(search_term)
+    if match is None:
+        return []
+    weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+    rows = db.session.execute(
+        text(f"SELECT rowid FROM product_search WHERE product_search MATCH :match "
+             f"ORDER BY bm25(product_search, {weights}) LIMIT :limit"),
+        {"match": match, "limit": limit},
+    ).all()
+    ids = [row[0] for row in rows]
+    if not ids:
+        return []
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+    # Rows deleted outside the admin views may still be indexed until the next rebuild
+    return [products[i] for i in ids if i in products]
+
+
+def _search_like(search_term, limit):
+    pattern = f"%{search_term}%"
+    return (Product.query
+            .outerjoin(Category)
+            .filter(db.or_(Product.name.ilike(pattern),
+                           Product.description.ilike(pattern),
+                           Category.name.ilike(pattern)))
+            .order_by(Product.id.desc())
+            .limit(limit)
+            .all())
@@ -1,22 +1,13 @@
 document.addEventListener("DOMContentLoaded", function () {
   const cartCounter = document.getElementById("cart-counter");
 
-  function updateCartCount() {
-    fetch("/cart/count")
-      .then((response) => response.json())
-      .then((data) => {
-        if (data.cart_count !== undefined) {
-          cartCounter.textContent = data.cart_count;
-        }
-      })
-      .catch((error) => {
-        console.error("Error fetching cart count:", error);
-      });
+  // The badge is rendered by the server; it only changes when something is added here
+  function updateCartCount(count) {
+    if (cartCounter) {
+      cartCounter.textContent = count;
+    }
   }
 
-  // Initial cart count update on page load
-  updateCartCount();
-
   const addToCartButtons = document.querySelectorAll(".add-to-cart-btn");
   const toastNotification = document.getElementById("toast-notification");
 
@@ -33,7 +24,7 @@ document.addEventListener("DOMContentLoaded", function () {
         .then((response) => response.json())
         .then((data) => {
           if (data.cart_count !== undefined) {
-            updateCartCount(); // Update cart count after adding a product
+            updateCartCount(data.cart_count); // The response already carries the new count
 
             // Show the notification
             toastNotification.classList.add("show");
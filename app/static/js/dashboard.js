@@ -5,29 +5,14 @@
 
   // Graphs
   const ctx = document.getElementById('myChart')
-  // eslint-disable-next-line no-unused-vars
+  const filters = document.getElementById('chart-filters')
+  const total = document.getElementById('chart-total')
   const myChart = new Chart(ctx, {
     type: 'line',
     data: {
-      labels: [
-        'Sunday',
-        'Monday',
-        'Tuesday',
-        'Wednesday',
-        'Thursday',
-        'Friday',
-        'Saturday'
-      ],
+      labels: [],
       datasets: [{
-        data: [
-          15339,
-          21345,
-          18483,
-          24003,
-          23489,
-          24092,
-          12034
-        ],
+        data: [],
         lineTension: 0,
         backgroundColor: 'transparent',
         borderColor: '#007bff',
@@ -46,4 +31,40 @@
       }
     }
   })
+
+  // Category rollups only have revenue and units
+  const metric = filters.elements.metric
+  const category = filters.elements.category
+  const updateMetrics = () => {
+    for (const option of metric.options) {
+      option.disabled = category.value !== '' && !['revenue', 'units'].includes(option.value)
+    }
+    if (metric.selectedOptions[0].disabled) {
+      metric.value = 'revenue'
+    }
+  }
+
+  const load = async () => {
+    updateMetrics()
+    const params = new URLSearchParams()
+    for (const [name, value] of new FormData(filters)) {
+      if (value) {
+        params.set(name, value)
+      }
+    }
+    const response = await fetch(`${ctx.dataset.url}?${params}`, { credentials: 'same-origin' })
+    const data = await response.json()
+    if (!response.ok) {
+      total.textContent = data.error
+      return
+    }
+    myChart.data.labels = data.labels
+    myChart.data.datasets[0].data = data.values
+    myChart.update()
+    total.textContent = `Total: ${data.total.toLocaleString()}`
+  }
+
+  filters.addEventListener('change', load)
+  filters.addEventListener('submit', event => event.preventDefault())
+  load()
 })()
@@ -0,0 +1,253 @@
+import math
+import random
+from array import array
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import func
+from app import db, passwords, search, facets, ratings, leaderboard, analytics, counters
+from app.models import Cart, CartItem, Category, Newsletter, Order, OrderProduct, Product, Review, User
+
+BATCH_SIZE = 10000
+ZIPF_EXPONENT = 1.1
+DEFAULT_PASSWORD = 'Passw0rd!'
+SHIPPING_DELAY = 7 # Orders placed in the last days before `until` are still Pending
+
+CATEGORY_NAMES = ('Shoes', 'Shirts', 'Jackets', 'Bags', 'Watches', 'Hats', 'Books', 'Toys', 'Kitchen',
+                  'Garden', 'Audio', 'Phones', 'Laptops', 'Cameras', 'Sports', 'Beauty', 'Games', 'Office')
+ADJECTIVES = ('Classic', 'Compact', 'Deluxe', 'Eco', 'Essential', 'Lightweight', 'Modern', 'Premium',
+              'Rugged', 'Smart', 'Vintage', 'Wireless', 'Everyday', 'Pro', 'Travel', 'Urban')
+NOUNS = ('Sneaker', 'Backpack', 'Lamp', 'Mug', 'Jacket', 'Speaker', 'Bottle', 'Notebook', 'Headphones',
+         'Chair', 'Watch', 'Blender', 'Tent', 'Keyboard', 'Scarf', 'Camera', 'Wallet', 'Kettle')
+FIRST_NAMES = ('Alex', 'Sam', 'Maria', 'John', 'Aisha', 'Chen', 'Lucas', 'Emma', 'Omar', 'Yuki', 'Ivan',
+               'Nora', 'Leila', 'Tom', 'Sara', 'Diego')
+LAST_NAMES = ('Smith', 'Garcia', 'Kim', 'Müller', 'Rossi', 'Haddad', 'Silva', 'Novak', 'Dubois', 'Tanaka')
+REVIEW_TEXTS = ('Great value for the price.', 'Does exactly what it says.', 'Arrived quickly, well packed.',
+                'Quality could be better.', 'Would buy again!', 'Not what I expected.',
+                'My second one, still happy.', 'Looks even better in person.')
+# Share of 1 to 5 star reviews
+RATING_WEIGHTS = (5, 7, 13, 30, 45)
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert(model, rows):
+    """
+    Inserts `rows` (an iterable of dicts) in BATCH_SIZE executemany batches,
+    committing each. Returns the number of rows.
+    """
+    count, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(model.__table__.insert(), batch)
+            db.session.commit()
+            count, batch = count + len(batch), []
+    if batch:
+        db.session.execute(model.__table__.insert(), batch)
+        db.session.commit()
+    return count + len(batch)
+
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT):
+    """
+    Cumulative weights of ranks 1..n under Zipf's law, for random.choices().
+    """
+    weights, total = array('d'), 0.0
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** exponent
+        weights.append(total)
+    return weights
+
+
+def season_weights(start, days):
+    """
+    Cumulative weights of each day from `start`: sales peak in December,
+    are lowest in June, are higher at weekends and grow slowly over the
+    period.
+    """
+    weights, total = array('d'), 0.0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        yearly = 1 + 0.4 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 350) / 365.25)
+        weekly = 1.25 if day.weekday() >= 5 else 1.0
+        growth = 1 + 0.5 * offset / days
+        total += yearly * weekly * growth
+        weights.append(total)
+    return weights
+
+
+def _moment(rng, day):
+    return datetime.combine(day, time()) + timedelta(seconds=rng.randrange(86400))
+
+
+def generate(users=1000, categories=20, products=1000, orders=5000, reviews=2000, subscribers=500,
+             carts=0.1, days=730, until=None, seed=42, password=DEFAULT_PASSWORD, progress=None):
+    """
+    Adds synthetic rows to the database, the same ones for the same seed,
+    until date and starting database:
+
+    - users sharing one password, hashed once; the first is an admin if
+      there is none,
+    - categories, and products with log-normal prices,
+    - orders of 1 to 4 lines, whose products follow a Zipf distribution
+      and whose dates follow weekly and yearly seasons over the `days`
+      before `until`, shipped unless recent,
+    - reviews (Zipf products, mostly good ratings), newsletter subscribers,
+      and carts for a `carts` share of the new users.
+
+    Missing tables are created. Everything goes through multi-row INSERTs
+    with precomputed ids, then the search index, facets, ratings,
+    leaderboard, sales rollups and counters are rebuilt. `progress(message)` reports each step.
+    Returns {table: rows added}.
+    """
+    db.create_all()
+    rng = random.Random(seed)
+    until = until or date.today()
+    start = until - timedelta(days=days - 1)
+    report = progress or (lambda message: None)
+    added = {}
+
+    # Users: one bcrypt hash for everybody, so creating a million users costs one hash
+    hashed = passwords.hash_password(password)
+    first_user = _next_id(User)
+    needs_admin = not db.session.query(User.query.filter_by(is_admin=True).exists()).scalar()
+    added['user'] = _insert(User, ({
+        'id': user_id,
+        'fname': rng.choice(FIRST_NAMES),
+        'lname': rng.choice(LAST_NAMES),
+        'username': f"user{user_id}",
+        'email': f"user{user_id}@example.com",
+        'password': hashed,
+        'gender': rng.choice(('Male', 'Female')),
+        'created_at': _moment(rng, start + timedelta(days=rng.randrange(days))),
+        'is_admin': needs_admin and user_id == first_user,
+    } for user_id in range(first_user, first_user + users)))
+    report(f"{users} users")
+
+    first_category = _next_id(Category)
+    taken = {name for (name,) in db.session.query(Category.name)}
+
+    def category_name(category_id):
+        name = CATEGORY_NAMES[(category_id - 1) % len(CATEGORY_NAMES)]
+        if category_id > len(CATEGORY_NAMES) or name in taken:
+            name = f"{name} {category_id}"
+        return name
+
+    added['category'] = _insert(Category, ({'id': category_id, 'name': category_name(category_id)}
+                                           for category_id in range(first_category, first_category + categories)))
+    category_ids = [category_id for (category_id,) in db.session.query(Category.id).order_by(Category.id)]
+    report(f"{categories} categories")
+
+    uploader = db.session.query(User.id).filter_by(is_admin=True).order_by(User.id).limit(1).scalar()
+    if products and uploader is None:
+        raise ValueError("Products need an admin uploader: generate at least one user.")
+    first_product = _next_id(Product)
+    added['product'] = _insert(Product, ({
+        'id': product_id,
+        'name': f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}",
+        'description': f"A {rng.choice(ADJECTIVES).lower()} pick from our {rng.choice(CATEGORY_NAMES).lower()} range.",
+        'price': Decimal(min(round(rng.lognormvariate(3.3, 0.9), 2), 99999)).quantize(Decimal('0.01')),
+        'stock': rng.randrange(0, 500),
+        'category_id': rng.choice(category_ids) if category_ids else None,
+        'user_id': uploader,
+    } for product_id in range(first_product, first_product + products)))
+    report(f"{products} products")
+
+    # Popularity: a random ranking of the whole catalog, sampled with Zipf weights
+    product_ids, cents = array('q'), array('q')
+    for product_id, price in db.session.query(Product.id, Product.price).order_by(Product.id).yield_per(BATCH_SIZE):
+        product_ids.append(product_id)
+        cents.append(int(price * 100))
+    ranking = list(range(len(product_ids)))
+    rng.shuffle(ranking)
+    popularity = zipf_weights(len(ranking))
+    user_ids = array('q', (user_id for (user_id,) in db.session.query(User.id).order_by(User.id)))
+
+    def popular_products(k):
+        return [ranking[rank] for rank in rng.choices(range(len(ranking)), cum_weights=popularity, k=k)]
+
+    if orders and (not product_ids or not user_ids):
+        raise ValueError("Orders need products and users.")
+    order_days = sorted(rng.choices(range(days), cum_weights=season_weights(start, days), k=orders)) if orders else []
+    shipped_before = until - timedelta(days=SHIPPING_DELAY)
+    first_order = _next_id(Order)
+    added['order'] = added['order_product'] = 0
+    # One batch of orders and their lines at a time, in date order
+    for batch_start in range(0, orders, BATCH_SIZE):
+        order_rows, line_rows = [], []
+        for offset in range(batch_start, min(batch_start + BATCH_SIZE, orders)):
+            order_id = first_order + offset
+            day = start + timedelta(days=order_days[offset])
+            placed = _moment(rng, day)
+            quantities = {}
+            for index in popular_products(rng.choice((1, 1, 2, 2, 3, 4))):
+                quantities[index] = quantities.get(index, 0) + rng.choice((1, 1, 1, 2, 3))
+            total = 0
+            for index, quantity in quantities.items():
+                total += cents[index] * quantity
+                line_rows.append({'order_id': order_id, 'product_id': product_ids[index], 'quantity': quantity})
+            shipped = day < shipped_before
+            order_rows.append({
+                'id': order_id,
+                'user_id': user_ids[rng.randrange(len(user_ids))],
+                'order_date': placed,
+                'total_amount': Decimal(total) / 100,
+                'status': 'Shipped' if shipped else 'Pending',
+                'stock_reserved': True,
+                'shipped_at': placed + timedelta(hours=rng.randrange(6, 96)) if shipped else None,
+            })
+        added['order'] += _insert(Order, order_rows)
+        added['order_product'] += _insert(OrderProduct, line_rows)
+    report(f"{added['order']} orders with {added['order_product']} lines")
+
+    first_review = _next_id(Review)
+
+    def review_rows():
+        for review_id in range(first_review, first_review + reviews):
+            yield {
+                'id': review_id,
+                'user_id': user_ids[rng.randrange(len(user_ids))],
+                'product_id': product_ids[popular_products(1)[0]],
+                'rating': rng.choices((1, 2, 3, 4, 5), weights=RATING_WEIGHTS)[0],
+                'text': rng.choice(REVIEW_TEXTS),
+                'created_at': _moment(rng, start + timedelta(days=rng.randrange(days))),
+            }
+
+    added['review'] = _insert(Review, review_rows()) if reviews and product_ids and user_ids else 0
+    report(f"{added['review']} reviews")
+    first_subscriber = _next_id(Newsletter)
+    added['newsletter'] = _insert(Newsletter, ({
+        'id': subscriber_id,
+        'email': f"subscriber{subscriber_id}@example.com",
+        'subscription_date': _moment(rng, start + timedelta(days=rng.randrange(days))),
+    } for subscriber_id in range(first_subscriber, first_subscriber + subscribers)))
+    report(f"{subscribers} newsletter subscribers")
+
+    # Carts only for new users, who can't have one yet
+    cart_users = [user_id for user_id in range(first_user, first_user + users) if rng.random() < carts] \
+        if product_ids else []
+    first_cart, first_item = _next_id(Cart), _next_id(CartItem)
+    added['cart'] = _insert(Cart, ({'id': first_cart + offset, 'user_id': user_id}
+                                   for offset, user_id in enumerate(cart_users)))
+
+    def cart_item_rows():
+        item_id = first_item
+        for offset in range(len(cart_users)):
+            for index in set(popular_products(rng.choice((1, 1, 2, 3)))):
+                yield {'id': item_id, 'cart_id': first_cart + offset, 'product_id': product_ids[index],
+                       'quantity': rng.choice((1, 1, 2))}
+                item_id += 1
+
+    added['cart_item'] = _insert(CartItem, cart_item_rows())
+    report(f"{added['cart']} carts with {added['cart_item']} items")
+
+    report("Rebuilding search index, facets, ratings, leaderboard, sales rollups and counters")
+    search.rebuild_index()
+    facets.rebuild()
+    ratings.rebuild()
+    leaderboard.rebuild()
+    analytics.backfill()
+    counters.reconcile()
+    return added
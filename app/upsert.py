@@ -0,0 +1,37 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+# Databases with INSERT ... ON CONFLICT DO UPDATE
+_UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def add(model, keys, values):
+    """
+    Adds `values` to the columns of the `model` row whose primary key is
+    `keys`, creating the row with `values` if it doesn't exist, within the
+    caller's transaction.
+
+    It is one INSERT ... ON CONFLICT DO UPDATE, so two transactions that
+    both create the row (the first orders of a day) both count, instead of
+    one failing on the primary key. Other databases try the INSERT in a
+    savepoint and fall back to the UPDATE.
+    """
+    upsert = _UPSERTS.get(db.session.get_bind().dialect.name)
+    if upsert is not None:
+        statement = upsert(model).values(**keys, **values)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: getattr(model, column) + getattr(statement.excluded, column) for column in values},
+        ))
+        return
+
+    increments = {getattr(model, column): getattr(model, column) + value for column, value in values.items()}
+    if model.query.filter_by(**keys).update(increments, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**keys, **values))
+    except IntegrityError:
+        model.query.filter_by(**keys).update(increments, synchronize_session=False)
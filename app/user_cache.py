@@ -0,0 +1,102 @@
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import app, db, login_manager
+from app.cache import cache
+from app.models import Cart, User
+
+# What flask-login keeps about a signed-in user between requests: enough for
+# the navbar, admin checks, ban checks and the account forms' uniqueness checks
+FIELDS = ('id', 'username', 'fname', 'lname', 'email', 'image_file', 'is_admin', 'is_banned')
+
+
+def _key(user_id):
+    return f"user:{user_id}"
+
+
+class CachedUser(UserMixin):
+    """
+    Stand-in for `User` as `current_user`, built from the cached fields.
+
+    Any other attribute (password, orders, bio...) loads the full record on
+    first use. It is read-only: views that change the signed-in user must
+    load the record with db.session.get(User, current_user.id), whose
+    commit then evicts the cached fields.
+    """
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+        self.__dict__['_record'] = None
+
+    @property
+    def record(self):
+        if self._record is None:
+            self.__dict__['_record'] = db.session.get(User, self.id)
+        return self._record
+
+    @property
+    def cart(self):
+        # Direct lookup, so the cart pages don't load the user row first
+        if self._record is not None:
+            return self._record.cart
+        return Cart.query.filter_by(user_id=self.id).first()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"current_user is read-only, change db.session.get(User, {self.id}).{name} instead")
+
+    def __repr__(self):
+        return f"CachedUser('{self.username}', '{self.email}', '{self.image_file}')"
+
+
+def _fields(user_id):
+    row = db.session.query(*(getattr(User, name) for name in FIELDS)).filter(User.id == user_id).first()
+    return dict(zip(FIELDS, row)) if row else None
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    """
+    Reads the signed-in user from the per-worker cache, for USER_CACHE_TTL
+    seconds, so identifying them costs no query. Commits that change a
+    user evict their entry in this worker; the TTL bounds how long other
+    workers may keep serving a banned user or an old name.
+    """
+    user_id = int(user_id)
+    ttl = app.config['USER_CACHE_TTL']
+    fields = cache.get_or_set(_key(user_id), lambda: _fields(user_id), ttl) if ttl else _fields(user_id)
+    if fields is None or fields['is_banned']:
+        return None # Unknown or banned, do not load
+    return CachedUser(fields)
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_users(session, flush_context, instances):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            session.info.setdefault('users_touched', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk_user_statements(orm_execute_state):
+    # Query.update() / Query.delete() on users don't say which rows they hit
+    if ((orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper
+            and orm_execute_state.bind_mapper.class_ is User):
+        orm_execute_state.session.info['users_touched_all'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_users(session):
+    if session.info.pop('users_touched_all', False):
+        cache.invalidate_prefix('user:')
+    cache.invalidate(*(_key(user_id) for user_id in session.info.pop('users_touched', ())))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_users(session):
+    session.info.pop('users_touched', None)
+    session.info.pop('users_touched_all', None)
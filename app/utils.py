@@ -1,62 +1,84 @@
-import os
-import secrets
-from PIL import Image
+from types import SimpleNamespace
 from flask import current_app
 from app import app,db,bcrypt
 from datetime import datetime, timedelta
 from sqlalchemy import func
-from app.models import Order,User
-
-def save_picture(form_picture, path, output_size=None):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_name = random_hex + f_ext
-
-    # Create the full path to the directory
-    picture_dir = os.path.join(app.root_path, path)
-    
-    # Create the directory if it doesn't exist
-    os.makedirs(picture_dir, exist_ok=True)
-    
-    picture_path = os.path.join(picture_dir, picture_name)
-    
-    i = Image.open(form_picture)
-    if output_size:
-        i.thumbnail(output_size)
-    i.save(picture_path)
-    return picture_name
-
-def delete_picture(picture_name, path):
-    """
-    Deletes a picture from the filesystem, if it exists.
+from app.models import Order,User,Product
+from app.sampling import sample_reviews
+from app import leaderboard, search, facets, ratings, images, counters
+
+def save_picture(form_picture, kind):
+    """
+    Stores an uploaded product ('product') or profile ('user') picture and
+    returns its file name; resized variants are rendered in the background.
+    Raises images.InvalidImage if the upload is not a usable image.
+    """
+    return images.save_upload(form_picture, kind)
+
+def delete_picture(picture_name, kind):
+    """
+    Deletes a picture and its resized variants from the filesystem, unless
+    it is the default picture or another product or user still uses it
+    (identical uploads share one file). Call it once the rows that used
+    the picture are deleted or changed.
 
     Args:
         picture_name (str): The name of the picture file to delete.
-        path (str): The directory path where the picture is located, relative to app.root_path.
-    """
-    picture_path = os.path.join(app.root_path, path, picture_name)
-    
-    # Check if the file exists before attempting to delete it
-    if os.path.exists(picture_path):
-        try:
-            os.remove(picture_path)
-        except OSError as e:
-            # Handle permissions or other OS-level errors
-            print(f"Error deleting file {picture_path}: {e}")
-            
+        kind (str): 'product' or 'user'.
+    """
+    if not picture_name or picture_name == 'default.png':
+        return
+    column = images.COLUMNS[kind]
+    if db.session.query(column).filter(column == picture_name).first():
+        return
+    images.delete_image(picture_name, kind)
+
+def forget_user_content(user):
+    """
+    Call before deleting a user: their products and reviews go with them
+    through the cascades, so take them out of the search index, the facet
+    counts, the rating aggregates and the admin counters in the same
+    transaction.
+    Returns the (picture, kind) pairs to pass to delete_picture() once the
+    deletion is committed.
+    """
+    pictures = [(user.image_file, 'user')]
+    counters.user_removed(user)
+    removed_products = set()
+    for product in user.uploaded_products:
+        search.remove_product(product.id)
+        facets.product_removed(product)
+        removed_products.add(product.id)
+        pictures.append((product.image_file, 'product'))
+    for review in user.reviews:
+        if review.product_id not in removed_products:
+            ratings.review_removed(review)
+    return pictures
+
 def get_client_of_the_week():
-    today = datetime.utcnow()
-    start_of_week = today - timedelta(days=today.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-
-    top_client = db.session.query(
-        User,
-        func.sum(Order.total_amount).label('total_spent')
-    ).join(Order, User.id == Order.user_id)\
-    .filter(Order.order_date >= start_of_week)\
-    .filter(Order.order_date <= end_of_week)\
-    .group_by(User)\
-    .order_by(func.sum(Order.total_amount).desc())\
-    .first()
-
-    return top_client[0] if top_client else None
+    return leaderboard.client_of_the_week()
+
+def get_featured_products(limit=4):
+    """
+    Returns the most expensive products as plain snapshots (id, name, price,
+    image_file) that can be cached and rendered outside the session.
+    """
+    products = Product.query.order_by(Product.price.desc()).limit(limit).all()
+    return [SimpleNamespace(id=p.id, name=p.name, price=p.price, image_file=p.image_file) for p in products]
+
+def get_random_reviews(limit=5):
+    """
+    Returns random reviews as plain snapshots (text, rating, author.username).
+    """
+    reviews = sample_reviews(limit)
+    return [
+        SimpleNamespace(text=r.text, rating=r.rating, author=SimpleNamespace(username=r.author.username))
+        for r in reviews
+    ]
+
+def get_client_of_the_week_snapshot():
+    """
+    Same as get_client_of_the_week(), reduced to what the home page shows.
+    """
+    client = get_client_of_the_week()
+    return SimpleNamespace(username=client.username) if client else None
@@ -0,0 +1,61 @@
+"""
+    CODE FOR TEST ONLY
+
+Setup shared by the benchmarks: a throwaway SQLite database, "Bench"
+users and products to run against, and logging a test client in.
+"""
+import os
+import tempfile
+
+PASSWORD = "Passw0rd!"
+
+
+def temp_database(name):
+    """
+    Points the app at a new SQLite file and returns its path. Call it
+    before importing `app`, which binds its database at import.
+    """
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    return path
+
+
+def create_users(count=1, password=None):
+    """
+    Creates the tables if needed and `count` users (bench, or bench0,
+    bench1... when there are several), flushed so they have ids. Without
+    a `password` they share a placeholder and are logged in with login().
+    """
+    from app import db, passwords
+    from app.models import User
+    db.create_all()
+    hashed = passwords.hash_password(password) if password else "-"
+    names = ["bench"] if count == 1 else [f"bench{n}" for n in range(count)]
+    users = [User(fname="Bench", lname="Mark", username=name, email=f"{name}@example.com", password=hashed,
+                  gender="Male") for name in names]
+    db.session.add_all(users)
+    db.session.flush()
+    return users
+
+
+def create_product(user, name="Bench product", price=10, stock=1, category="Bench"):
+    """
+    Creates a product uploaded by `user` in a new category, flushed.
+    """
+    from app import db
+    from app.models import Category, Product
+    product = Product(name=name, price=price, stock=stock, category=Category(name=category), user_id=user.id)
+    db.session.add(product)
+    db.session.flush()
+    return product
+
+
+def login(client, user_id):
+    """
+    Signs a test client in as `user_id` through its session, skipping the
+    password check.
+    """
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
@@ -0,0 +1,69 @@
+"""
+    CODE FOR TEST ONLY
+
+Fires `--checkouts` parallel checkouts, each from a different customer
+with one unit of the same product in their cart, against a product that
+only has `--stock` units. Reports throughput, how many orders were
+accepted or refused for lack of stock, and how many units were oversold
+(accepted orders beyond the initial stock, which must be 0).
+
+    python -m benchmarks.bench_checkout_concurrency --checkouts 300 --stock 100 --threads 32
+"""
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import _fixtures as fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkouts", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    fixtures.temp_database("bench_checkout")
+    from app import app, db, mail
+    from app.models import Cart, CartItem, Order, Product
+
+    app.config.update(WTF_CSRF_ENABLED=False, MAIL_USERNAME="shop@example.com", OUTBOX_WORKERS=0)
+    mail.init_app(app)
+
+    with app.app_context():
+        # Customers log in through the session directly, so they share a placeholder password
+        users = fixtures.create_users(args.checkouts)
+        product = fixtures.create_product(users[0], name="Limited edition", stock=args.stock)
+        for user in users:
+            db.session.add(Cart(user_id=user.id, items=[CartItem(product_id=product.id, quantity=1)]))
+        db.session.commit()
+        product_id = product.id
+        user_ids = [user.id for user in users]
+
+    def checkout(user_id):
+        client = fixtures.login(app.test_client(), user_id)
+        response = client.post("/checkout")
+        if response.status_code != 302:
+            return f"HTTP {response.status_code}"
+        return "accepted" if "order_confirmation" in response.location else "refused"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        outcomes = Counter(executor.map(checkout, user_ids))
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        orders = Order.query.count()
+        stock_left = db.session.get(Product, product_id).stock
+
+    print(f"{args.checkouts} checkouts on {args.threads} threads in {elapsed:.2f}s "
+          f"({args.checkouts / elapsed:.1f} checkouts/s)")
+    print("outcomes:", dict(outcomes))
+    print(f"orders {orders}  stock {args.stock} -> {stock_left}  oversold {max(orders - args.stock, 0)}")
+    if orders + stock_left != args.stock or stock_left < 0:
+        raise SystemExit("stock does not add up")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+    CODE FOR TEST ONLY
+
+Measures checkout latency with order emails sent inline (the old behaviour)
+and through the outbox workers, against a local SMTP sink that answers
+each command after `--delay` seconds.
+
+    python -m benchmarks.bench_checkout_mail --checkouts 50 --delay 0.05
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import _fixtures as fixtures
+from benchmarks.smtp_sink import SMTPSink
+
+
+def checkout_latencies(app, client, product_id, count, after_checkout=None):
+    samples = []
+    for _ in range(count):
+        client.post("/add_to_cart", json={"product_id": product_id, "quantity": 1})
+        start = time.perf_counter()
+        client.post("/checkout")
+        if after_checkout:
+            after_checkout()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return f"p50 {statistics.median(samples):8.2f}ms  p95 {samples[int(len(samples) * 0.95) - 1]:8.2f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkouts", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05, help="SMTP sink delay per command, in seconds")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    sink = SMTPSink(delay=args.delay).start()
+    fixtures.temp_database("bench_mail")
+    from app import app, db, mail, outbox
+    from app.models import OutboxEmail
+
+    app.config.update(
+        WTF_CSRF_ENABLED=False,
+        MAIL_SERVER="127.0.0.1",
+        MAIL_PORT=sink.port,
+        MAIL_USE_TLS=False,
+        MAIL_USERNAME="shop@example.com",
+        MAIL_PASSWORD=None,
+        OUTBOX_WORKERS=0,
+    )
+    mail.init_app(app)
+
+    with app.app_context():
+        user, = fixtures.create_users(password=fixtures.PASSWORD)
+        product = fixtures.create_product(user, stock=10 ** 6)
+        db.session.commit()
+        product_id = product.id
+
+    client = app.test_client()
+    client.post("/login", data={"email": "bench@example.com", "password": fixtures.PASSWORD})
+
+    def send_inline():
+        with app.app_context():
+            outbox.drain()
+
+    inline = checkout_latencies(app, client, product_id, args.checkouts, after_checkout=send_inline)
+    print(f"mail inline   {summary(inline)}")
+
+    received_before = sink.received
+    with app.app_context():
+        pool = outbox.OutboxWorkerPool(app, args.workers)
+        pool.start()
+    queued = checkout_latencies(app, client, product_id, args.checkouts)
+    print(f"mail outbox   {summary(queued)}")
+
+    start = time.perf_counter()
+    expected = args.checkouts * 2
+    while sink.received - received_before < expected and time.perf_counter() - start < 120:
+        time.sleep(0.05)
+    pool.stop(timeout=10)
+    print(f"outbox delivered {sink.received - received_before}/{expected} emails "
+          f"{time.perf_counter() - start:.2f}s after the last checkout")
+    with app.app_context():
+        print("outbox rows by status:",
+              dict(db.session.query(OutboxEmail.status, db.func.count()).group_by(OutboxEmail.status).all()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+    CODE FOR TEST ONLY
+
+Compares sample_reviews() with ORDER BY random() as the review table grows.
+
+    python -m benchmarks.bench_review_sampling --sizes 1000 100000 1000000 10000000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import _fixtures as fixtures
+
+
+def grow_reviews(db, target, user_id, product_id):
+    from app.models import Review
+    rng = random.Random(7)
+    current = Review.query.count()
+    while current < target:
+        batch = min(50000, target - current)
+        db.session.execute(Review.__table__.insert(), [
+            {"rating": rng.randint(1, 5), "text": "Lorem ipsum dolor sit amet",
+             "user_id": user_id, "product_id": product_id}
+            for _ in range(batch)
+        ])
+        current += batch
+    # Punch some holes in the id range so the sampler has gaps to retry on
+    db.session.execute(Review.__table__.delete().where(Review.id % 10 == 3))
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fixtures.temp_database("bench_sampling")
+    from sqlalchemy import func
+    from app import app, db
+    from app.cache import cache
+    from app.models import Review
+    from app.sampling import sample_reviews
+
+    with app.app_context():
+        user, = fixtures.create_users()
+        product = fixtures.create_product(user, price=1)
+        db.session.commit()
+
+        print(f"{'reviews':>10}{'random() p50':>16}{'sampler p50':>14}{'rating>=5 p50':>16}")
+        for size in sorted(args.sizes):
+            grow_reviews(db, size, user.id, product.id)
+            cache.clear()
+            random_order = timed(lambda: Review.query.order_by(func.random()).limit(5).all(), min(args.repeat, 5))
+            sampler = timed(lambda: sample_reviews(5), args.repeat)
+            filtered = timed(lambda: sample_reviews(5, min_rating=5), args.repeat)
+            print(f"{size:>10}{random_order:>14.2f}ms{sampler:>12.2f}ms{filtered:>14.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
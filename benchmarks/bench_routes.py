@@ -0,0 +1,242 @@
+"""
+    CODE FOR TEST ONLY
+
+Measures the p50/p99 latency and query count of the hot routes through the
+Flask test client, against synthetic stores of each `--sizes` number of
+products (seeded once by `flask synthetic generate` rules and cached in
+`--cache-dir`, every run works on a copy). `--output` saves the results as
+JSON; `--baseline` compares against saved results and exits with status 1
+when a route got slower by more than `--threshold` (and `--min-delta-ms`)
+or runs more queries.
+
+    python -m benchmarks.bench_routes --sizes 1000,100000,1000000 --output baseline.json
+    python -m benchmarks.bench_routes --sizes 1000,100000,1000000 --baseline baseline.json --threshold 0.25
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from benchmarks import _fixtures as fixtures
+
+SEED = 42
+UNTIL = date(2026, 1, 1)
+SEARCH_TERMS = ("sneaker", "wireless speaker", "premium", "vint", "eco bottle", "zzz")
+CART_PRODUCTS = 3
+
+
+def seed_sizes(products):
+    """
+    The rest of the store grows with the catalog.
+    """
+    return dict(users=max(50, products // 10), categories=20, products=products, orders=max(100, products // 2),
+                reviews=max(100, products // 5), subscribers=max(20, products // 20), carts=0.05)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def prepare(size, cache_dir):
+    """
+    Points the app at a fresh copy of the seeded store for `size`, seeding
+    it first if it isn't cached. Must run before `app` is imported.
+    """
+    cached = os.path.join(cache_dir, f"bench_routes_{size}_{SEED}.db")
+    path = fixtures.temp_database("bench_routes")
+    os.environ.setdefault("MEDIA_ROOT", tempfile.mkdtemp())
+    if os.path.exists(cached):
+        shutil.copyfile(cached, path)
+        return None
+    return lambda: shutil.copyfile(path, cached)
+
+
+def run(size, args):
+    keep = prepare(size, args.cache_dir)
+    from sqlalchemy import func
+    from app import app, db, mail, profiler, synthetic
+    from app.models import Cart, CartItem, Category, Product, User
+
+    app.config.update(WTF_CSRF_ENABLED=False, MAIL_USERNAME="shop@example.com", OUTBOX_WORKERS=0)
+    mail.init_app(app)
+    app.extensions['mail'].suppress = True
+
+    with app.app_context():
+        if keep:
+            start = time.perf_counter()
+            synthetic.generate(**seed_sizes(size), until=UNTIL, seed=SEED)
+            db.engine.dispose()
+            keep()
+            print(f"Seeded {size} products in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        admin_id = db.session.query(User.id).filter_by(is_admin=True).order_by(User.id).limit(1).scalar()
+        customer_id = db.session.query(func.max(User.id)).scalar()
+        category_id = db.session.query(Category.id).order_by(Category.id).limit(1).scalar()
+        rng = random.Random(SEED)
+        product_count = db.session.query(func.max(Product.id)).scalar()
+        detail_ids = [rng.randint(1, product_count) for _ in range(args.iterations + args.warmup)]
+        cart_ids = rng.sample(range(1, product_count + 1), CART_PRODUCTS)
+        # Checkouts must not run out of stock
+        Product.query.filter(Product.id.in_(cart_ids)).update({Product.stock: 10 ** 9}, synchronize_session=False)
+        cart = Cart.query.filter_by(user_id=customer_id).first() or Cart(user_id=customer_id)
+        db.session.add(cart)
+        db.session.commit()
+        cart_id = cart.id
+
+    def fill_cart():
+        with app.app_context():
+            CartItem.query.filter_by(cart_id=cart_id).delete()
+            db.session.add_all(CartItem(cart_id=cart_id, product_id=product_id, quantity=1) for product_id in cart_ids)
+            db.session.commit()
+
+    anonymous = app.test_client()
+    customer, admin = fixtures.login(app.test_client(), customer_id), fixtures.login(app.test_client(), admin_id)
+    detail = iter(detail_ids)
+    search = itertools.cycle(SEARCH_TERMS)
+
+    # name: (client, method, path or callable returning it, request kwargs, expected status,
+    #        untimed setup before each request)
+    routes = {
+        "main.home": (anonymous, "GET", "/", {}, 200, None),
+        "products.products": (anonymous, "GET", "/products", {}, 200, None),
+        "products.products price_asc": (anonymous, "GET", "/products?sort_by=price_asc", {}, 200, None),
+        "products.products price_desc": (anonymous, "GET", "/products?sort_by=price_desc", {}, 200, None),
+        "products.products category": (anonymous, "GET", f"/products?category={category_id}", {}, 200, None),
+        "products.products price range": (anonymous, "GET", "/products?min_price=20&max_price=50", {}, 200, None),
+        "products.products category price_asc": (
+            anonymous, "GET", f"/products?category={category_id}&min_price=20&sort_by=price_asc", {}, 200, None),
+        "products.search_products": (
+            anonymous, "POST", "/products/search", lambda: {"data": {"search": next(search)}}, 200, None),
+        "products.product_detail": (anonymous, "GET", lambda: f"/product/{next(detail)}", {}, 200, None),
+        "orders.cart": (customer, "GET", "/cart", {}, 200, fill_cart),
+        "orders.cart_count": (customer, "GET", "/cart/count", {}, 200, None),
+        "orders.add_to_cart": (
+            customer, "POST", "/add_to_cart", {"json": {"product_id": cart_ids[0], "quantity": 1}}, 200, None),
+        "orders.checkout": (customer, "POST", "/checkout", {}, 302, fill_cart),
+        "admin.users": (admin, "GET", "/admin/users", {}, 200, None),
+        "admin.products": (admin, "GET", "/admin/products", {}, 200, None),
+        "admin.orders": (admin, "GET", "/admin/orders", {}, 200, None),
+        "admin.subscriptions": (admin, "GET", "/admin/subscriptions", {}, 200, None),
+    }
+
+    results = {}
+    for name, (client, method, path, kwargs, expected, setup) in routes.items():
+        if args.routes and not any(part in name for part in args.routes.split(",")):
+            continue
+        samples, counts = [], []
+        for iteration in range(args.warmup + args.iterations):
+            if setup:
+                setup()
+            url = path() if callable(path) else path
+            options = kwargs() if callable(kwargs) else kwargs
+            with profiler.profile(name) as queries:
+                start = time.perf_counter()
+                response = client.open(url, method=method, **options)
+                elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != expected:
+                raise SystemExit(f"{name}: {method} {url} returned {response.status_code}, expected {expected}")
+            if iteration >= args.warmup:
+                samples.append(elapsed)
+                counts.append(queries.count)
+        results[name] = {
+            "p50_ms": round(statistics.median(samples), 3),
+            "p99_ms": round(percentile(samples, 0.99), 3),
+            "queries": max(counts),
+        }
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Prints each size's results against the baseline and returns the
+    regressions: slower than the baseline by more than `threshold` (a
+    fraction) and `min_delta_ms`, or running more queries.
+    """
+    regressions = []
+    for size, routes in results["sizes"].items():
+        base_routes = baseline.get("sizes", {}).get(size, {}) if baseline else {}
+        print(f"\n{size} products")
+        print(f"{'route':<40}{'p50':>10}{'p99':>10}{'queries':>9}{'base p50':>10}{'base p99':>10}{'base q':>8}")
+        for name, result in routes.items():
+            base = base_routes.get(name)
+            line = f"{name:<40}{result['p50_ms']:>8.2f}ms{result['p99_ms']:>8.2f}ms{result['queries']:>9}"
+            if base:
+                line += f"{base['p50_ms']:>8.2f}ms{base['p99_ms']:>8.2f}ms{base['queries']:>8}"
+                problems = []
+                for metric in ("p50_ms", "p99_ms"):
+                    if (result[metric] > base[metric] * (1 + threshold)
+                            and result[metric] - base[metric] > min_delta_ms):
+                        problems.append(f"{metric} {base[metric]:.2f} -> {result[metric]:.2f}")
+                if result["queries"] > base["queries"]:
+                    problems.append(f"queries {base['queries']} -> {result['queries']}")
+                if problems:
+                    line += "  REGRESSION"
+                    regressions.append(f"{size} products, {name}: {', '.join(problems)}")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated numbers of products")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--routes", help="Only the routes whose name contains one of these comma-separated parts")
+    parser.add_argument("--cache-dir", default=tempfile.gettempdir(), help="Where seeded stores are kept")
+    parser.add_argument("--output", help="Save the results to this JSON file, e.g. as the next baseline")
+    parser.add_argument("--baseline", help="Compare with the results saved in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Slowdowns below this are noise")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    if len(sizes) == 1:
+        measured = {str(sizes[0]): run(sizes[0], args)}
+    else:
+        # The app binds its database at import, so each size runs in its own process
+        measured = {}
+        for size in sizes:
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                part = f.name
+            command = [sys.executable, "-m", "benchmarks.bench_routes", "--sizes", str(size),
+                       "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+                       "--cache-dir", args.cache_dir, "--output", part]
+            if args.routes:
+                command += ["--routes", args.routes]
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            with open(part) as f:
+                measured.update(json.load(f)["sizes"])
+            os.remove(part)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "iterations": args.iterations,
+        "python": sys.version.split()[0],
+        "sizes": measured,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
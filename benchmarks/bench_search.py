@@ -0,0 +1,84 @@
+"""
+    CODE FOR TEST ONLY
+
+Compares the FTS5 product search with the old ILIKE scan on a generated catalog.
+
+    python -m benchmarks.bench_search --products 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks import _fixtures as fixtures
+
+WORDS = ("red blue green black white leather cotton wool running hiking summer winter "
+         "classic slim vintage sport casual formal shoe boot jacket shirt dress scarf "
+         "bag watch belt hat sock glove lamp chair table mug").split()
+SYLLABLES = "ka lo mi ra ten vo zu bel cor dan fi gra hu jin".split()
+# Brand-like words make the vocabulary closer to a real catalog than WORDS alone
+BRANDS = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})
+TERMS = ["shoe", "red leather", "vint", "wool scarf", "hiking boot", "formal", "kalomi", "zzz"]
+
+
+def populate(db, count):
+    from app.models import Category, Product
+    user, = fixtures.create_users()
+    categories = [Category(name=name) for name in ("Shoes", "Clothing", "Home", "Accessories")]
+    db.session.add_all(categories)
+    db.session.commit()
+
+    rng = random.Random(42)
+    rows = []
+    for i in range(count):
+        rows.append({
+            "name": f"{rng.choice(BRANDS)} {' '.join(rng.sample(WORDS, 2))}".title(),
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.randint(0, 50),
+            "category_id": rng.choice(categories).id,
+            "user_id": user.id,
+        })
+        if len(rows) == 10000:
+            db.session.execute(Product.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Product.__table__.insert(), rows)
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    fixtures.temp_database("bench_search")
+    from app import app, db, search
+    from app.models import Product
+
+    with app.app_context():
+        populate(db, args.products)
+        start = time.perf_counter()
+        search.rebuild_index()
+        print(f"{args.products} products, index built in {time.perf_counter() - start:.2f}s\n")
+
+        print(f"{'term':<14}{'ilike p50':>12}{'ilike max':>12}{'fts p50':>12}{'fts max':>12}{'hits':>8}")
+        for term in TERMS:
+            ilike = timed(lambda: Product.query.filter(Product.name.ilike(f"%{term}%")).all(), args.repeat)
+            fts = timed(lambda: search.search(term), args.repeat)
+            hits = len(search.search(term))
+            print(f"{term:<14}{ilike[0]:>10.2f}ms{ilike[1]:>10.2f}ms{fts[0]:>10.2f}ms{fts[1]:>10.2f}ms{hits:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+    CODE FOR TEST ONLY
+
+Counts the static asset requests and bytes a browser needs for a page,
+on a first visit and on a repeat visit with a warm cache, with plain
+assets and with fingerprinted, precompressed ones.
+
+A repeat visit revalidates plain assets (one request each, answered 304)
+and skips fingerprinted ones entirely, since they are cached as immutable.
+
+    python -m benchmarks.bench_static_bytes --page / --page /products
+"""
+import argparse
+import re
+
+from benchmarks import _fixtures as fixtures
+
+ASSET_URL = re.compile(r'(?:href|src)="(/static/[^"]+\.(?:css|js|svg))"')
+
+
+def visit(client, page, cache):
+    """
+    Loads `page` and its assets like a browser would; `cache` maps asset
+    URLs to the validators and Cache-Control seen on the previous visit.
+    Returns (requests, bytes) spent on the assets.
+    """
+    html = client.get(page).get_data(as_text=True)
+    requests, transferred = 0, 0
+    for url in dict.fromkeys(ASSET_URL.findall(html)):
+        cached = cache.get(url)
+        if cached and "immutable" in cached["cache_control"]:
+            continue
+        headers = {"Accept-Encoding": "gzip, br"}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        response = client.get(url, headers=headers)
+        requests += 1
+        transferred += len(response.get_data())
+        if response.status_code == 200:
+            cache[url] = {"etag": response.headers.get("ETag"),
+                          "cache_control": response.headers.get("Cache-Control", "")}
+        response.close()
+    return requests, transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", action="append", help="Pages to load, default / and /products")
+    args = parser.parse_args()
+    pages = args.page or ["/", "/products"]
+
+    fixtures.temp_database("bench_static")
+    from app import app, assets, db
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    for fingerprint in (False, True):
+        app.config["ASSETS_FINGERPRINT"] = fingerprint
+        assets.load()
+        label = "fingerprinted" if fingerprint else "plain"
+        for page in pages:
+            cache = {}
+            first = visit(client, page, cache)
+            repeat = visit(client, page, cache)
+            print(f"{label:<14} {page:<12} first visit {first[0]:>3} requests {first[1]:>8} bytes   "
+                  f"repeat visit {repeat[0]:>3} requests {repeat[1]:>8} bytes")
+
+
+if __name__ == "__main__":
+    main()
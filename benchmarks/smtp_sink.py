@@ -0,0 +1,79 @@
+"""
+    CODE FOR TEST ONLY
+
+A minimal SMTP server that accepts every message and throws it away, used as
+a local stand-in for the real mail server. `delay` simulates a slow server
+by sleeping before answering each command.
+
+    python -m benchmarks.smtp_sink --port 2525 --delay 0.2
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 localhost SMTP sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-localhost\r\n")
+                self.reply("250 SIZE 10485760")
+            elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline().rstrip(b"\r\n") != b".":
+                    pass
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        super().__init__((host, port), SMTPSinkHandler)
+        self.delay = delay
+        self.received = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    sink = SMTPSink(port=args.port, delay=args.delay)
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port}")
+    sink.serve_forever()
+
+
+if __name__ == "__main__":
+    main()